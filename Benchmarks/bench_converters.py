@@ -0,0 +1,219 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+
+# Times every reader -> writer pair of text_converter_david and every format -> format pair of
+# image_converter_david on synthetic inputs generated locally, and compares against a JSON baseline.
+# Each case runs in a fresh process so its peak RSS is its own.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXT_FOLDER = os.path.join(ROOT, 'Procesadores de texto')
+IMAGE_FOLDER = os.path.join(ROOT, 'Procesadores de imagen')
+sys.path[:0] = [TEXT_FOLDER, IMAGE_FOLDER]
+
+TEXT_SIZES = {'10KB': 10 * 1024, '1MB': 1024 * 1024, '10MB': 10 * 1024 * 1024}
+IMAGE_SIZES = {'256px': 256, '1024px': 1024, '4096px': 4096}
+IMAGE_MODES = ['RGB', 'RGBA', 'L', 'P']
+WORDS = ['realidad', 'aumentada', 'marcador', 'textura', 'conversión', 'archivo', 'imagen', 'página',
+         'documento', 'señal', 'cámara', 'modelo', 'escena', 'capa', 'color', 'píxel']
+
+"""CORPUS GENERATION"""
+def synthetic_text(size):
+    rng = random.Random(size)
+    parts = []
+    written = 0
+    while written < size:
+        paragraph = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))) + '.\n\n'
+        parts.append(paragraph)
+        written += len(paragraph.encode('utf-8'))
+    return ''.join(parts)
+
+def make_text_corpus(folder, sizes):
+    import text_converter_david as text
+    corpus = {}
+    for label, size in sizes.items():
+        source = os.path.join(folder, f"doc_{label}.txt")
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write(synthetic_text(size))
+        corpus[(label, '.txt')] = source
+        for ext in text.SUPPORTED_EXTENSIONS:
+            if ext == '.txt':
+                continue
+            if ext not in text.WRITERS:
+                # .doc has no writer, there is nothing to generate it with
+                continue
+            path = os.path.join(folder, f"doc_{label}{ext}")
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    text.WRITERS[ext](text.READERS['.txt'](source), path)
+            except Exception as e:
+                print(f"skipping {ext} corpus ({label}): {e}", file=sys.stderr)
+                continue
+            corpus[(label, ext)] = path
+    return corpus
+
+def synthetic_svg(size):
+    shapes = ''.join(f'<circle cx="{(i * 37) % size}" cy="{(i * 53) % size}" r="{size // 10}" fill="#{(i * 123457) % 0xFFFFFF:06x}" fill-opacity="0.6"/>'
+                     for i in range(50))
+    return f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 {size} {size}">{shapes}</svg>'
+
+def make_image_corpus(folder, sizes):
+    from PIL import Image
+    import image_converter_david as image
+    from image_frames import save_image
+    corpus = {}
+    for label, size in sizes.items():
+        # A gradient plus noise, so encoders cannot shortcut on flat colour
+        base = Image.radial_gradient('L').resize((size, size))
+        noise = Image.effect_noise((size, size), 40)
+        rgb = Image.merge('RGB', (base, noise, base.transpose(Image.Transpose.ROTATE_90)))
+        sources = {'RGB': rgb, 'RGBA': rgb.convert('RGBA'), 'L': base, 'P': rgb.quantize(256)}
+        sources['RGBA'].putalpha(noise)
+        for mode in IMAGE_MODES:
+            for ext in image.SUPPORTED_EXTENSIONS:
+                if ext == '.svg':
+                    continue
+                path = os.path.join(folder, f"img_{label}_{mode}{ext}")
+                format_name = Image.registered_extensions()[ext]
+                save_image(sources[mode], path, format_name)
+                corpus[(f"{label}_{mode}", ext)] = path
+        path = os.path.join(folder, f"img_{label}.svg")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(synthetic_svg(size))
+        corpus[(label, '.svg')] = path
+    return corpus
+
+"""CASE RUNNERS"""
+def peak_rss_kb():
+    # ru_maxrss survives fork and exec on Linux, so a freshly spawned case would report at least the
+    # parent's peak (the corpus generation); VmHWM belongs to this process's own address space
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def run_text_case(input_path, output_format, output_folder, repeat):
+    import text_converter_david as text
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            code = text.convert_file(input_path, output_format, output_folder)
+        elapsed = time.perf_counter() - start
+        if code:
+            raise RuntimeError("convert_file failed")
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak_rss_kb()
+
+def run_image_case(input_path, output_format, output_folder, repeat):
+    import image_converter_david as image
+    output_path = image.get_output_path(input_path, output_folder, output_format)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image.convert_image(input_path, output_path, output_format)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak_rss_kb()
+
+def run_case(runner, input_path, output_format, repeat):
+    with tempfile.TemporaryDirectory() as output_folder:
+        seconds, peak_kb = runner(input_path, output_format, output_folder, repeat)
+    size_mb = os.path.getsize(input_path) / (1024 * 1024)
+    return {
+        'seconds': seconds,
+        'mb_per_s': size_mb / seconds if seconds else None,
+        'files_per_s': 1 / seconds if seconds else None,
+        'peak_rss_mb': peak_kb / 1024,
+        'input_mb': size_mb,
+    }
+
+def run_matrix(name, runner, corpus, output_formats, repeat):
+    results = {}
+    # One process per case, spawned fresh so imports and peak memory do not leak between cases
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for (label, ext), input_path in sorted(corpus.items()):
+            for output_format in output_formats:
+                if output_format == ext and name == 'image':
+                    continue
+                case = f"{name}:{ext}->{output_format}:{label}"
+                try:
+                    results[case] = pool.apply(run_case, (runner, input_path, output_format, repeat))
+                except Exception as e:
+                    results[case] = {'error': (str(e) or type(e).__name__).splitlines()[0]}
+                print_case(case, results[case])
+    return results
+
+def print_case(case, result):
+    if 'error' in result:
+        print(f"{case:45} ERROR {result['error']}")
+    else:
+        print(f"{case:45} {result['seconds'] * 1000:9.1f} ms {result['mb_per_s']:8.2f} MB/s "
+              f"{result['files_per_s']:8.2f} files/s {result['peak_rss_mb']:8.1f} MB RSS")
+
+"""BASELINE"""
+def compare(results, baseline, tolerance):
+    regressions = []
+    for case, result in results.items():
+        previous = baseline.get(case)
+        if not previous or 'error' in result or 'error' in previous:
+            continue
+        if result['mb_per_s'] < previous['mb_per_s'] * (1 - tolerance):
+            regressions.append(f"{case}: {result['mb_per_s']:.2f} MB/s, baseline {previous['mb_per_s']:.2f} MB/s")
+        if result['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{case}: {result['peak_rss_mb']:.1f} MB RSS, baseline {previous['peak_rss_mb']:.1f} MB")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the text and image converters on synthetic inputs.")
+    parser.add_argument('--only', choices=['text', 'image'], help="Run a single suite")
+    parser.add_argument('--text-sizes', default='10KB,1MB', help=f"Comma separated, from {', '.join(TEXT_SIZES)}")
+    parser.add_argument('--image-sizes', default='256px,1024px', help=f"Comma separated, from {', '.join(IMAGE_SIZES)}")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case, the fastest one is kept")
+    parser.add_argument('--save', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="JSON file with previous results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown or memory growth (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as corpus_folder:
+        if args.only in (None, 'text'):
+            import text_converter_david as text
+            corpus = make_text_corpus(corpus_folder, {label: TEXT_SIZES[label] for label in args.text_sizes.split(',')})
+            results.update(run_matrix('text', run_text_case, corpus, list(text.WRITERS), args.repeat))
+        if args.only in (None, 'image'):
+            import image_converter_david as image
+            corpus = make_image_corpus(corpus_folder, {label: IMAGE_SIZES[label] for label in args.image_sizes.split(',')})
+            output_formats = [ext for ext in image.SUPPORTED_EXTENSIONS if ext != '.svg']
+            results.update(run_matrix('image', run_image_case, corpus, output_formats, args.repeat))
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
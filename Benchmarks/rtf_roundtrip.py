@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+
+# Sends accented, CJK and non-BMP text through every route the planner takes out of and into RTF
+# (the planned one and the plain-text fallback without pandoc) and reads the result back with the
+# native readers. Any text that does not come back unchanged is reported and the exit code is 1.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXT_FOLDER = os.path.join(ROOT, 'Procesadores de texto')
+sys.path[:0] = [TEXT_FOLDER]
+
+ACCENTED = "Línea con acentos: ñandú, pingüino, año, canción. ¿Qué? ¡Sí!\n\nComillas “dobles” y guion — largo.\n"
+WIDE = "CJK 中文字符, fuera del plano básico 😀 𝄞 𠀋 y de vuelta.\n"
+# The PDF writer uses the standard Helvetica font, which has no CJK or emoji glyphs
+NARROW_FORMATS = {'.pdf'}
+
+def normalize(text):
+    return ' '.join(text.split())
+
+def routes(text, input_file, output_format):
+    plans = [text.plan_conversion(input_file, output_format)]
+    fallback = text.plan_conversion(input_file, output_format, exclude=('pandoc',))
+    if fallback and plans[0] and fallback.kinds != plans[0].kinds:
+        plans.append(fallback)
+    return [plan for plan in plans if plan]
+
+def check(text, input_file, output_format, expected, folder):
+    failures = []
+    for i, plan in enumerate(routes(text, input_file, output_format)):
+        output_file = os.path.join(folder, f"route{i}_{os.path.basename(input_file)}{output_format}")
+        try:
+            text.run_plan(plan, input_file, output_file)
+            result = ''.join(text.READERS[output_format](output_file))
+        except Exception as e:
+            result = f"<{type(e).__name__}: {e}>"
+        ok = normalize(result) == normalize(expected)
+        print(f"{'ok  ' if ok else 'FAIL'} {plan.describe()}")
+        if not ok:
+            failures.append(f"{plan.describe()}: got {normalize(result)[:120]!r}")
+    return failures
+
+def main():
+    import text_converter_david as text
+
+    failures = []
+    with tempfile.TemporaryDirectory() as folder:
+        for output_format in text.WRITERS:
+            if output_format == '.rtf':
+                continue
+            expected = ACCENTED if output_format in NARROW_FORMATS else ACCENTED + WIDE
+            source = os.path.join(folder, 'source.txt')
+            with open(source, 'w', encoding='utf-8') as f:
+                f.write(expected)
+            # Out of RTF: the native writer's output, as every RTF this project produces
+            rtf_file = os.path.join(folder, f"from{output_format[1:]}.rtf")
+            text.WRITERS['.rtf'](text.READERS['.txt'](source), rtf_file)
+            failures += check(text, rtf_file, output_format, expected, folder)
+            # Into RTF: a document written by the native writer of the other format
+            if output_format in text.READERS:
+                other_file = os.path.join(folder, f"to_rtf{output_format}")
+                text.WRITERS[output_format](text.READERS['.txt'](source), other_file)
+                failures += check(text, other_file, '.rtf', expected, folder)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
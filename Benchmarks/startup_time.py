@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Measures the cold import time of the converter scripts with `python -X importtime`,
+# so a new module-level import of a heavy backend shows up as a regression.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = {
+    'text_converter_david': os.path.join(ROOT, 'Procesadores de texto'),
+    'image_converter_david': os.path.join(ROOT, 'Procesadores de imagen'),
+}
+
+def parse_importtime(stderr):
+    # Lines look like "import time:       self [us] |  cumulative | imported package"
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def measure(module, folder, repeat):
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=folder, capture_output=True, text=True)
+        if result.returncode:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        timings = parse_importtime(result.stderr)
+        if best is None or timings[module][1] < best[module][1]:
+            best = timings
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of the converters.")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per module, the fastest one is kept")
+    parser.add_argument('--top', type=int, default=10, help="How many of the slowest imports to list")
+    parser.add_argument('--baseline', help="JSON file with previous results to compare against")
+    parser.add_argument('--save', help="Write the results to this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown against the baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for module, folder in MODULES.items():
+        try:
+            timings = measure(module, folder, args.repeat)
+        except RuntimeError as e:
+            print(f"{module}: import failed ({e})")
+            continue
+        total_ms = timings[module][1] / 1000
+        results[module] = {'total_ms': total_ms, 'modules_loaded': len(timings)}
+        print(f"{module}: {total_ms:.1f} ms, {len(timings)} modules")
+        slowest = sorted(timings.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+        for name, (self_us, _) in slowest:
+            print(f"    {self_us / 1000:8.1f} ms  {name}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for module, result in results.items():
+            if module not in baseline:
+                continue
+            limit = baseline[module]['total_ms'] * (1 + args.tolerance)
+            if result['total_ms'] > limit:
+                regressions += 1
+                print(f"REGRESSION: {module} took {result['total_ms']:.1f} ms (baseline {baseline[module]['total_ms']:.1f} ms)")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
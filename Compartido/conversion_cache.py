@@ -0,0 +1,110 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+# On-disk cache of converted files, keyed by the content of the input, the output format and the options.
+# Entries are plain files named <key><ext>; their mtime is bumped on every hit so eviction is LRU.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ra-programas')
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# (path, size, mtime_ns) -> digest, so a file is only hashed once per process
+_digests = {}
+
+def file_digest(path):
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _digests:
+        h = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(HASH_BLOCK_SIZE)
+                if not block:
+                    break
+                h.update(block)
+        _digests[memo_key] = h.hexdigest()
+    return _digests[memo_key]
+
+class ConversionCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, hardlink=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hardlink = hardlink
+        self._size = None
+
+    def make_key(self, input_path, output_format, options=None):
+        h = hashlib.blake2b(digest_size=20)
+        h.update(file_digest(input_path).encode())
+        h.update(output_format.lower().encode())
+        h.update(json.dumps(options or {}, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def entry_path(self, key, output_format):
+        return os.path.join(self.cache_dir, key[:2], key + output_format.lower())
+
+    def fetch(self, key, output_format, output_path):
+        entry = self.entry_path(key, output_format)
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            return False
+        self._place(entry, output_path)
+        return True
+
+    def store(self, key, output_format, output_path):
+        entry = self.entry_path(key, output_format)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # Copy under a temporary name first so other processes never see a half-written entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry))
+        os.close(fd)
+        try:
+            shutil.copyfile(output_path, tmp_path)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, entry)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        if self._size is not None:
+            self._size += os.path.getsize(entry)
+        if self._size is None or self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        self._size = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self._size = 0
+
+    def _place(self, entry, output_path):
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if self.hardlink:
+            try:
+                os.link(entry, output_path)
+                return
+            except OSError:
+                # Different drive or a filesystem without hard links
+                pass
+        shutil.copyfile(entry, output_path)
@@ -0,0 +1,166 @@
+import sys
+import json
+import time
+import tracemalloc
+import contextlib
+
+# Per-stage timing and memory records for a conversion (read, decode, convert, encode, write...).
+# Every record is a dict with wall time, CPU time, bytes in/out and peak traced memory; records go
+# to hook callbacks and, optionally, to a JSON lines file. summarize() aggregates them for a batch.
+class StageStats:
+    def __init__(self, name, bytes_in=0, **fields):
+        self.name = name
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.fields = fields
+        self.peak = 0
+
+class TimedIterator:
+    # Wraps a generator and only counts the time spent producing items, not consuming them
+    def __init__(self, instrumentation, name, iterable, bytes_in=0):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.bytes_in = bytes_in
+        self.iterator = iter(iterable)
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.items = 0
+        self.chars = 0
+        self.done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            item = next(self.iterator)
+        except StopIteration:
+            self._finish()
+            raise
+        finally:
+            self.wall_s += time.perf_counter() - wall
+            self.cpu_s += time.process_time() - cpu
+        self.items += 1
+        self.chars += len(item)
+        return item
+
+    def _finish(self):
+        if not self.done:
+            self.done = True
+            self.instrumentation.emit({'stage': self.name, 'wall_s': self.wall_s, 'cpu_s': self.cpu_s,
+                                       'bytes_in': self.bytes_in, 'items': self.items, 'chars_out': self.chars})
+
+class Instrumentation:
+    def __init__(self, sink=None, hooks=None, trace_memory=True, keep=False, enabled=True, **context):
+        self.enabled = enabled
+        self.hooks = list(hooks or [])
+        self.trace_memory = trace_memory
+        self.keep = keep
+        self.context = context
+        self.records = []
+        self._stack = []
+        self._started_tracing = False
+        self._owns_sink = isinstance(sink, str)
+        # Append mode, so worker processes can share one trace file line by line
+        self.sink = open(sink, 'a', encoding='utf-8') if self._owns_sink else sink
+
+    @contextlib.contextmanager
+    def stage(self, name, bytes_in=0, exclude=None, **fields):
+        stats = StageStats(name, bytes_in, **fields)
+        if not self.enabled:
+            yield stats
+            return
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            # Resetting the peak for this stage would hide the outer stage's peak, so save it first
+            if self._stack:
+                self._stack[-1].peak = max(self._stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            start_memory = current
+        self._stack.append(stats)
+        wall, cpu = time.perf_counter(), time.process_time()
+        error = None
+        try:
+            yield stats
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            wall_s = time.perf_counter() - wall
+            cpu_s = time.process_time() - cpu
+            self._stack.pop()
+            record = {'stage': name, 'wall_s': wall_s, 'cpu_s': cpu_s,
+                      'bytes_in': stats.bytes_in, 'bytes_out': stats.bytes_out}
+            if exclude is not None:
+                # Time spent inside a wrapped reader belongs to that reader's own record
+                record['wall_s'] -= exclude.wall_s
+                record['cpu_s'] -= exclude.cpu_s
+            if self.trace_memory:
+                peak = max(stats.peak, tracemalloc.get_traced_memory()[1])
+                record['peak_mem_bytes'] = peak - start_memory
+                if self._stack:
+                    self._stack[-1].peak = max(self._stack[-1].peak, peak)
+            if error is not None:
+                record['error'] = str(error)
+            record.update(stats.fields)
+            self.emit(record)
+
+    def timed_iter(self, name, iterable, bytes_in=0):
+        if not self.enabled:
+            return iterable
+        return TimedIterator(self, name, iterable, bytes_in)
+
+    def emit(self, record):
+        record.update(self.context)
+        if self.keep:
+            self.records.append(record)
+        if self.sink is not None:
+            self.sink.write(json.dumps(record) + '\n')
+            self.sink.flush()
+        for hook in self.hooks:
+            hook(record)
+
+    def close(self):
+        if self._owns_sink:
+            self.sink.close()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+NULL_INSTRUMENTATION = Instrumentation(enabled=False)
+
+def summarize(records):
+    summary = {}
+    for record in records:
+        stage = summary.setdefault(record['stage'], {'count': 0, 'errors': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                                                      'max_wall_s': 0.0, 'bytes_in': 0, 'bytes_out': 0,
+                                                      'max_peak_mem_bytes': 0})
+        stage['count'] += 1
+        stage['errors'] += 'error' in record
+        stage['wall_s'] += record['wall_s']
+        stage['cpu_s'] += record['cpu_s']
+        stage['max_wall_s'] = max(stage['max_wall_s'], record['wall_s'])
+        stage['bytes_in'] += record.get('bytes_in', 0)
+        stage['bytes_out'] += record.get('bytes_out', 0)
+        stage['max_peak_mem_bytes'] = max(stage['max_peak_mem_bytes'], record.get('peak_mem_bytes', 0))
+    return summary
+
+def print_summary(summary, out=None):
+    out = out or sys.stderr
+    total = sum(stage['wall_s'] for stage in summary.values()) or 1
+    print(f"{'stage':14} {'count':>6} {'wall s':>9} {'share':>6} {'cpu s':>9} {'max s':>8} {'MB in':>9} {'MB out':>9} {'peak MB':>8}", file=out)
+    for name, stage in sorted(summary.items(), key=lambda item: item[1]['wall_s'], reverse=True):
+        print(f"{name:14} {stage['count']:6} {stage['wall_s']:9.3f} {stage['wall_s'] / total:6.1%} {stage['cpu_s']:9.3f} "
+              f"{stage['max_wall_s']:8.3f} {stage['bytes_in'] / 1048576:9.2f} {stage['bytes_out'] / 1048576:9.2f} "
+              f"{stage['max_peak_mem_bytes'] / 1048576:8.1f}", file=out)
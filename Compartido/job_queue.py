@@ -0,0 +1,82 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Runs conversions on a worker pool so the Tk mainloop never blocks. The GUI submits jobs and
+# gets called back from the Tk thread (via after() polling) whenever a job changes state.
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+
+class Job:
+    def __init__(self, job_id, label, future):
+        self.id = job_id
+        self.label = label
+        self.future = future
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+class JobQueue:
+    def __init__(self, root, func, on_update=None, max_workers=None, use_processes=True, poll_ms=100):
+        self.root = root
+        self.func = func
+        self.on_update = on_update
+        self.poll_ms = poll_ms
+        self.executor = ProcessPoolExecutor(max_workers) if use_processes else ThreadPoolExecutor(max_workers)
+        self.jobs = []
+        self.polling = False
+
+    def submit(self, label, *args):
+        job = Job(len(self.jobs), label, self.executor.submit(self.func, *args))
+        self.jobs.append(job)
+        self._notify(job)
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_ms, self._poll)
+        return job
+
+    def cancel(self, job=None):
+        # Queued jobs are dropped; a job that already started runs to the end
+        for pending in ([job] if job is not None else self.jobs):
+            if not pending.finished() and pending.future.cancel():
+                pending.status = CANCELLED
+                self._notify(pending)
+
+    def progress(self):
+        finished = sum(1 for job in self.jobs if job.finished())
+        return finished, len(self.jobs)
+
+    def active(self):
+        return any(not job.finished() for job in self.jobs)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self):
+        for job in self.jobs:
+            if job.finished():
+                continue
+            future = job.future
+            if future.cancelled():
+                job.status = CANCELLED
+            elif future.done():
+                try:
+                    job.result = future.result()
+                    job.status = DONE
+                except Exception as e:
+                    job.error = e
+                    job.status = FAILED
+            elif future.running() and job.status == QUEUED:
+                job.status = RUNNING
+            else:
+                continue
+            self._notify(job)
+
+        if self.active():
+            self.root.after(self.poll_ms, self._poll)
+        else:
+            self.polling = False
+
+    def _notify(self, job):
+        if self.on_update:
+            self.on_update(job)
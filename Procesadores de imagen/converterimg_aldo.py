@@ -1,13 +1,26 @@
 import os
+import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox
+# Los módulos que comparten los conversores de imagen y de texto están en Compartido
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Compartido'))
 from PIL import Image
+from image_frames import save_image
+from job_queue import JobQueue, DONE, FAILED
+
+ESTADOS = {'queued': 'en cola', 'running': 'convirtiendo', 'done': 'listo', 'failed': 'error', 'cancelled': 'cancelado'}
+
+# Se ejecuta en los procesos del pool, fuera de la interfaz
+def convert_and_save(image_path, save_path, output_format):
+    with Image.open(image_path) as img:
+        save_image(img, save_path, output_format)
+    return save_path
 
 class ImageConverterApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Conversor de Imágenes")
-        self.root.geometry("400x250")
+        self.root.geometry("450x420")
 
         self.label = tk.Label(root, text="Seleccionar imagen")
         self.label.pack(pady=10)
@@ -26,10 +39,17 @@ class ImageConverterApp:
         self.convert_button = tk.Button(root, text="Convertir y Guardar", command=self.convert_image)
         self.convert_button.pack(pady=10)
 
-        self.image_path = None
+        self.cancel_button = tk.Button(root, text="Cancelar pendientes", command=self.cancel_jobs)
+        self.cancel_button.pack()
+
+        self.job_list = tk.Listbox(root, width=55, height=6)
+        self.job_list.pack(pady=10)
+
+        self.image_paths = []
+        self.jobs = JobQueue(root, convert_and_save, on_update=self.update_job)
 
     def load_image(self):
-        file_path = filedialog.askopenfilename(filetypes=[
+        file_paths = filedialog.askopenfilenames(filetypes=[
             ("Todos los formatos soportados", "*.jpeg;*.jpg;*.png;*.gif;*.bmp;*.tiff;*.svg"),
             ("JPEG", "*.jpeg;*.jpg"),
             ("PNG", "*.png"),
@@ -39,30 +59,61 @@ class ImageConverterApp:
             ("SVG", "*.svg")
         ])
         
-        if file_path:
-            self.image_path = file_path
-            self.label.config(text=f"Imagen cargada: {os.path.basename(file_path)}")
+        if len(file_paths) == 1:
+            self.label.config(text=f"Imagen cargada: {os.path.basename(file_paths[0])}")
+        elif file_paths:
+            self.label.config(text=f"{len(file_paths)} imágenes cargadas")
+        if file_paths:
+            self.image_paths = list(file_paths)
 
     def convert_image(self):
-        if not self.image_path:
+        if not self.image_paths:
             messagebox.showerror("Error", "Por favor, selecciona una imagen primero")
             return
 
         output_format = self.format_var.get()
-        save_path = filedialog.asksaveasfilename(defaultextension=f".{output_format.lower()}",
-                                                 filetypes=[(output_format, f"*.{output_format.lower()}")])
-        
-        if not save_path:
-            return
+        if len(self.image_paths) == 1:
+            save_path = filedialog.asksaveasfilename(defaultextension=f".{output_format.lower()}",
+                                                     filetypes=[(output_format, f"*.{output_format.lower()}")])
+            if not save_path:
+                return
+            save_paths = [save_path]
+        else:
+            # Con varias imágenes se elige una carpeta y se conserva el nombre de cada una
+            folder = filedialog.askdirectory()
+            if not folder:
+                return
+            save_paths = [os.path.join(folder, f"{os.path.splitext(os.path.basename(path))[0]}.{output_format.lower()}")
+                          for path in self.image_paths]
+
+        # La conversión corre en segundo plano, la ventana sigue respondiendo
+        for image_path, save_path in zip(self.image_paths, save_paths):
+            self.jobs.submit(os.path.basename(save_path), image_path, save_path, output_format)
+
+    def cancel_jobs(self):
+        self.jobs.cancel()
+
+    def update_job(self, job):
+        if job.id < self.job_list.size():
+            self.job_list.delete(job.id)
+        self.job_list.insert(job.id, f"{job.label}: {ESTADOS[job.status]}")
+
+        if job.status == DONE and not self.jobs.active():
+            done = [j for j in self.jobs.jobs if j.status == DONE]
+            if len(done) == 1:
+                messagebox.showinfo("Éxito", f"Imagen guardada en {job.result}")
+            else:
+                messagebox.showinfo("Éxito", f"{len(done)} imágenes guardadas")
+        elif job.status == FAILED:
+            self.job_list.itemconfig(job.id, foreground="red")
+            messagebox.showerror("Error", f"No se pudo convertir la imagen: {job.error}")
 
-        try:
-            img = Image.open(self.image_path)
-            img.save(save_path, output_format)
-            messagebox.showinfo("Éxito", f"Imagen guardada en {save_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo convertir la imagen: {e}")
+    def close(self):
+        self.jobs.shutdown()
+        self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = ImageConverterApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.close)
     root.mainloop()
@@ -0,0 +1,76 @@
+import io
+import time
+from PIL import Image, features
+from image_frames import prepare_frame
+
+# Named encoder settings per output format. 'fast' spends the least time encoding, 'small' the
+# most time to get the smallest file and 'balanced' sits in between. Lossy formats keep the same
+# quality in every profile, so a profile changes encode time and file size but not how the image looks.
+PROFILES = ['fast', 'balanced', 'small']
+DEFAULT_PROFILE = 'balanced'
+
+ENCODER_PARAMS = {
+    'JPEG': {
+        'fast': {'quality': 75},
+        'balanced': {'quality': 75, 'optimize': True},
+        'small': {'quality': 75, 'optimize': True, 'progressive': True},
+    },
+    'PNG': {
+        'fast': {'compress_level': 1},
+        'balanced': {'compress_level': 6},
+        'small': {'compress_level': 9, 'optimize': True},
+    },
+    'WEBP': {
+        # method: 0 is the fastest encoder, 6 the slowest and smallest
+        'fast': {'quality': 80, 'method': 0},
+        'balanced': {'quality': 80, 'method': 4},
+        'small': {'quality': 80, 'method': 6},
+    },
+    'AVIF': {
+        # speed: 10 is the fastest encoder, 0 the slowest and smallest
+        'fast': {'quality': 75, 'speed': 10},
+        'balanced': {'quality': 75, 'speed': 6},
+        'small': {'quality': 75, 'speed': 2},
+    },
+    'TIFF': {
+        'fast': {},
+        'balanced': {'compression': 'tiff_lzw'},
+        'small': {'compression': 'tiff_adobe_deflate'},
+    },
+    'GIF': {
+        'fast': {},
+        'balanced': {},
+        'small': {'optimize': True},
+    },
+}
+
+# Writers that depend on how Pillow was built, by the codec module that provides them
+OPTIONAL_CODECS = {'WEBP': 'webp', 'AVIF': 'avif'}
+
+def can_save(format_name):
+    if format_name in OPTIONAL_CODECS:
+        # Only imports the codec; Image.init() would import every plugin when the converter starts
+        try:
+            return features.check_module(OPTIONAL_CODECS[format_name])
+        except ValueError:
+            # A Pillow too old to know the codec
+            return False
+    Image.init()
+    return format_name in Image.SAVE
+
+def encoder_params(format_name, profile=None):
+    return dict(ENCODER_PARAMS.get(format_name, {}).get(profile or DEFAULT_PROFILE, {}))
+
+def compare_profiles(img, format_name):
+    # Encodes the (already decoded) image with Pillow's defaults and with every profile, in memory.
+    # Returns one row per profile: (profile, bytes, seconds, bytes saved against the defaults)
+    frame = prepare_frame(img, format_name)
+    rows = []
+    for profile in [None] + PROFILES:
+        params = encoder_params(format_name, profile) if profile else {}
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        frame.save(buffer, format_name, **params)
+        rows.append((profile or 'default', buffer.tell(), time.perf_counter() - start))
+    default_size = rows[0][1]
+    return [(profile, size, seconds, default_size - size) for profile, size, seconds in rows]
@@ -1,67 +1,333 @@
+import io
 import os
-import tkinter as tk
-from tkinter import filedialog, StringVar, ttk
+import sys
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+# Modules shared by the image and text converters live in Compartido
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Compartido'))
 from PIL import Image
+from conversion_cache import ConversionCache
+from encoder_profiles import DEFAULT_PROFILE, PROFILES, can_save, compare_profiles, encoder_params
+from image_frames import ALPHA_FORMATS, raw_size, save_image
+from instrumentation import NULL_INSTRUMENTATION, Instrumentation, print_summary, summarize
+from svg_engine import load_svg, rasterize, sized_output_path
+from texture_assets import build_atlas, write_mip_pyramid
+from tiled_convert import DEFAULT_BUDGET, WRITERS as TILED_WRITERS, convert_tiled, exceeds_pixel_limit
 
-# Load Cairo library explicitly for SVG support
-import ctypes
-# Use custom path to the libcairo-2.dll file (bin folder has to be in the same directory as the script)
-current_dir = os.path.dirname(os.path.abspath(__file__))
-cairo_path = os.path.join(current_dir, "bin\\libcairo-2.dll")
-ctypes.windll.LoadLibrary(cairo_path)
-import cairosvg
+# WebP and AVIF are offered only when this Pillow build can write them
+SUPPORTED_EXTENSIONS = ['.jpeg', '.jpg', '.png', '.gif', '.bmp', '.tiff', '.svg'] + [
+    ext for ext, format_name in [('.webp', 'WEBP'), ('.avif', 'AVIF')] if can_save(format_name)]
 
-SUPPORTED_EXTENSIONS = ['.jpeg', '.jpg', '.png', '.gif', '.bmp', '.tiff', '.svg']
+def pillow_format(output_format):
+    # '.jpg' is not a Pillow format name, so look it up instead of deriving it from the extension
+    return Image.registered_extensions().get(output_format, output_format.upper().replace('.', ''))
 
-def convert_image(input_path, output_path, output_format):
+def convert_image(input_path, output_path, output_format, cache=None, width=None, instrument=None, profile=None):
+    instrument = instrument or NULL_INSTRUMENTATION
+    profile = profile or DEFAULT_PROFILE
+    # On a cache hit the stored output is copied (or hard-linked) to output_path without decoding anything
+    if cache is not None:
+        with instrument.stage('cache', bytes_in=os.path.getsize(input_path)) as stage:
+            key = cache.make_key(input_path, output_format, {'width': width, 'profile': profile})
+            stage.fields['hit'] = cache.fetch(key, output_format, output_path)
+        if stage.fields['hit']:
+            return
+    encode_image(input_path, output_path, output_format, width, instrument, profile)
+    if cache is not None:
+        with instrument.stage('cache_store', bytes_in=os.path.getsize(output_path)):
+            cache.store(key, output_format, output_path)
+
+def encode_image(input_path, output_path, output_format, width=None, instrument=None, profile=None):
+    instrument = instrument or NULL_INSTRUMENTATION
     ext = os.path.splitext(input_path)[1].lower()
+    format_name = pillow_format(output_format)
+    params = encoder_params(format_name, profile)
     
     if ext == '.svg' and output_format != '.svg':
-        if output_format == '.png':
-            cairosvg.svg2png(url=input_path, write_to=output_path)
-        elif output_format == '.pdf':
-            cairosvg.svg2pdf(url=input_path, write_to=output_path)
-        else:
-            print(f"SVG to {output_format} conversion not supported.")
+        # Parsed trees are kept in an LRU, so rendering the same SVG at several widths parses it once
+        rasterize(input_path, output_path, format_name, width=width, instrument=instrument, **params)
         return
     
     with Image.open(input_path) as img:
-        img = img.convert("RGBA") if output_format in ['.png', '.gif'] else img.convert("RGB")
-        img.save(output_path, output_format.upper().replace('.', ''))
+        with instrument.stage('decode', bytes_in=os.path.getsize(input_path), format=img.format) as stage:
+            img.load()
+            stage.bytes_out = raw_size(img)
+        # Converts the mode only when the target format needs it, and keeps every frame of animations
+        if not instrument.enabled:
+            save_image(img, output_path, format_name, **params)
+            return
+        # Encoded in memory first so the encoder and the disk write are timed apart
+        buffer = io.BytesIO()
+        save_image(img, buffer, format_name, instrument, **params)
+        with instrument.stage('write', bytes_in=buffer.tell()) as stage:
+            with open(output_path, 'wb') as f:
+                f.write(buffer.getbuffer())
+            stage.bytes_out = buffer.tell()
+
+def get_output_path(input_file, output_folder, output_format):
+    return os.path.join(output_folder, f"{os.path.splitext(os.path.basename(input_file))[0]}_converted{output_format}")
+
+def profile_report(input_files, output_format, out=None):
+    # Encodes every input with Pillow's defaults and with each profile, in memory, and prints
+    # sizes, bytes saved against the defaults and encode times; nothing is written to disk
+    out = out or sys.stdout
+    format_name = pillow_format(output_format)
+    totals = {}
+    print(f"{'file':40} {'profile':9} {'bytes':>11} {'saved':>11} {'saved %':>8} {'encode ms':>10}", file=out)
+    for input_file in input_files:
+        if input_file.lower().endswith('.svg'):
+            img = load_svg(input_file).render_image(background_color=None if format_name in ALPHA_FORMATS else 'white')
+        else:
+            img = Image.open(input_file)
+            img.load()
+        for profile, size, seconds, saved in compare_profiles(img, format_name):
+            total = totals.setdefault(profile, [0, 0, 0.0])
+            total[0] += size
+            total[1] += saved
+            total[2] += seconds
+            print(f"{os.path.basename(input_file)[:40]:40} {profile:9} {size:11} {saved:11} "
+                  f"{saved / (size + saved):8.1%} {seconds * 1000:10.1f}", file=out)
+    for profile, (size, saved, seconds) in totals.items():
+        print(f"{'TOTAL':40} {profile:9} {size:11} {saved:11} {saved / ((size + saved) or 1):8.1%} {seconds * 1000:10.1f}", file=out)
+
+"""BATCH CONVERSION"""
+def find_images(inputs):
+    # Yields (input_file, relative_folder) so directory trees keep their layout in the output folder
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        yield os.path.join(root, name), os.path.relpath(root, item)
+        else:
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path) and os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS:
+                    yield path, ''
+
+def convert_job(input_file, output_file, output_format, cache=None, svg_widths=None, trace=None, profile=None,
+                mipmaps=False, max_size=None, tiled=False, tile_budget=None):
+    # Runs inside a worker process, so errors are returned instead of raised.
+    # With trace set, the stage records travel back with the result (and go to trace['path'] if given)
+    profile = profile or DEFAULT_PROFILE
+    instrument = Instrumentation(trace.get('path'), keep=True, file=input_file, profile=profile) if trace is not None else NULL_INSTRUMENTATION
+    try:
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        format_name = pillow_format(output_format)
+        if (tiled or exceeds_pixel_limit(input_file)) and format_name in TILED_WRITERS:
+            # Band by band, for images too big to decode at once; Pillow's pixel limit is where a
+            # normal conversion would refuse the file. Outputs this size are not cached either.
+            convert_tiled(input_file, output_file, format_name, tile_budget or DEFAULT_BUDGET, instrument)
+        elif mipmaps:
+            # One decode for every level; a pyramid is several files, so it does not go through the cache
+            write_mip_pyramid(input_file, output_file, format_name, max_size, instrument, **encoder_params(format_name, profile))
+        elif svg_widths and input_file.lower().endswith('.svg'):
+            for width in svg_widths:
+                convert_image(input_file, sized_output_path(output_file, width), output_format, cache, width, instrument, profile)
+        else:
+            convert_image(input_file, output_file, output_format, cache, instrument=instrument, profile=profile)
+        return input_file, 0, None, instrument.records
+    except Exception as e:
+        return input_file, 1, str(e), instrument.records
+    finally:
+        if trace is not None:
+            instrument.close()
+
+def batch_convert(inputs, output_folder, output_format, workers=None, fail_fast=False, cache=None, svg_widths=None, trace=None, profile=None,
+                  mipmaps=False, max_size=None, tiled=False, tile_budget=None):
+    jobs = []
+    seen = set()
+    outputs = {}
+    collisions = 0
+    results = {}
+    records = []
+    failed = 0
+    for input_file, relative_folder in find_images(inputs):
+        if os.path.abspath(input_file) in seen:
+            continue
+        seen.add(os.path.abspath(input_file))
+        output_file = get_output_path(input_file, os.path.join(output_folder, relative_folder), output_format)
+        # anim.gif and anim.png in the same folder both map to anim_converted<ext>; only the first one is converted
+        output_key = os.path.normcase(os.path.abspath(output_file))
+        if output_key in outputs:
+            results[input_file] = 1
+            collisions += 1
+            print(f"ERROR: {input_file}: same output file as {outputs[output_key]} ({output_file})", file=sys.stderr)
+            continue
+        outputs[output_key] = input_file
+        jobs.append((input_file, output_file, output_format, cache, svg_widths, trace, profile, mipmaps, max_size, tiled, tile_budget))
+
+    if not jobs or (collisions and fail_fast):
+        for input_file, *_ in jobs:
+            results[input_file] = 2
+        return results
+
+    def collect(future):
+        nonlocal failed
+        input_file, code, error, job_records = future.result()
+        results[input_file] = code
+        records.extend(job_records)
+        if code:
+            failed += 1
+            print(f"\nERROR: {input_file}: {error}", file=sys.stderr)
+        return code
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(convert_job, *job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            code = collect(future)
+            print(f"\r[{done}/{len(jobs)}] converted: {done - failed}, failed: {failed}", end='', file=sys.stderr, flush=True)
+            if code and fail_fast:
+                for pending in futures:
+                    pending.cancel()
+                break
+    print(file=sys.stderr)
+
+    # The pool finishes the jobs that were already running when --on-error fail stopped the batch
+    for future in futures:
+        if not future.cancelled() and future.result()[0] not in results:
+            collect(future)
+    # Jobs cancelled by --on-error fail never ran
+    for input_file, *_ in jobs:
+        results.setdefault(input_file, 2)
+    if trace is not None and trace.get('summary'):
+        print_summary(summarize(records))
+    return results
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(description="Convert images without the GUI.")
+    parser.add_argument('inputs', nargs='+', help="Files, folders or glob patterns (use ** for recursion)")
+    parser.add_argument('-o', '--output-folder', required=True)
+    parser.add_argument('-f', '--format', required=True, choices=SUPPORTED_EXTENSIONS)
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--on-error', choices=['skip', 'fail'], default='skip', help="Keep going or stop at the first failed file")
+    parser.add_argument('--cache-dir', default=None, help="Reuse outputs of unchanged inputs from this folder")
+    parser.add_argument('--cache-size', type=int, default=1024, help="Cache size limit in MB (default: 1024)")
+    parser.add_argument('--hardlink', action='store_true', help="Hard-link cache hits instead of copying them")
+    parser.add_argument('--svg-sizes', default=None, help="Comma separated widths in pixels to render each SVG at, e.g. 64,128,256")
+    parser.add_argument('--trace', default=None, help="Append per-stage timing and memory records to this JSON lines file")
+    parser.add_argument('--trace-summary', action='store_true', help="Print per-stage totals for the whole batch to stderr")
+    parser.add_argument('--profile', choices=PROFILES, default=DEFAULT_PROFILE, help="Encoder settings: fast, balanced or small output (default: balanced)")
+    parser.add_argument('--profile-report', action='store_true', help="Print size, bytes saved and encode time of every profile instead of converting")
+    parser.add_argument('--mipmaps', action='store_true', help="Write every power-of-two size of each image, down to 1x1")
+    parser.add_argument('--max-size', type=int, default=None, help="Largest side in pixels for mipmaps and atlas images")
+    parser.add_argument('--atlas', default=None, metavar='NAME', help="Pack all inputs into atlas sheets NAME_0, NAME_1... with a JSON UV manifest NAME.json")
+    parser.add_argument('--atlas-size', type=int, default=2048, help="Atlas sheet size in pixels, a power of two (default: 2048)")
+    parser.add_argument('--atlas-padding', type=int, default=2, help="Empty pixels around each atlas image (default: 2)")
+    parser.add_argument('--tiled', action='store_true', help="Convert to TIFF or PNG band by band, for images larger than memory "
+                                                             "(always used for images over Pillow's pixel limit)")
+    parser.add_argument('--tile-budget', type=int, default=DEFAULT_BUDGET // (1024 * 1024), help="Memory for each band in MB (default: 256)")
+    args = parser.parse_args(argv)
+
+    if args.profile_report:
+        input_files = [input_file for input_file, _ in find_images(args.inputs)]
+        if not input_files:
+            print("No supported images found.", file=sys.stderr)
+            return 1
+        profile_report(input_files, args.format)
+        return 0
 
-def select_input_file(input_file_var):
-    file_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.jpeg;*.jpg;*.png;*.gif;*.bmp;*.tiff;*.svg")])
-    if file_path:
-        input_file_var.set(file_path)
+    if args.atlas:
+        # Every input ends up in the same sheets, so the atlas is built in this process
+        input_files = [input_file for input_file, _ in find_images(args.inputs)]
+        if not input_files:
+            print("No supported images found.", file=sys.stderr)
+            return 1
+        os.makedirs(args.output_folder, exist_ok=True)
+        format_name = pillow_format(args.format)
+        try:
+            manifest = build_atlas(input_files, args.output_folder, args.atlas, args.format, format_name, args.atlas_size,
+                                   args.atlas_padding, args.max_size, **encoder_params(format_name, args.profile))
+        except Exception as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+        print(manifest)
+        return 0
+
+    cache = None
+    if args.cache_dir:
+        cache = ConversionCache(args.cache_dir, args.cache_size * 1024 * 1024, args.hardlink)
+
+    svg_widths = [int(width) for width in args.svg_sizes.split(',')] if args.svg_sizes else None
+    trace = {'path': args.trace, 'summary': args.trace_summary} if args.trace or args.trace_summary else None
+    results = batch_convert(args.inputs, args.output_folder, args.format, args.workers, args.on_error == 'fail', cache, svg_widths, trace,
+                            args.profile, args.mipmaps, args.max_size, args.tiled, args.tile_budget * 1024 * 1024)
+    if not results:
+        print("No supported images found.", file=sys.stderr)
+        return 1
+
+    for input_file, code in results.items():
+        if code:
+            print(f"{code}\t{input_file}")
+    return 1 if any(results.values()) else 0
+
+def select_input_files(input_files, input_file_var):
+    from tkinter import filedialog
+    file_paths = filedialog.askopenfilenames(filetypes=[("Image Files", ';'.join('*' + ext for ext in SUPPORTED_EXTENSIONS))])
+    if file_paths:
+        input_files[:] = file_paths
+        input_file_var.set(file_paths[0] if len(file_paths) == 1 else f"{len(file_paths)} files selected")
 
 def select_output_folder(output_folder_var):
+    from tkinter import filedialog
     folder_path = filedialog.askdirectory()
     if folder_path:
         output_folder_var.set(folder_path)
 
-def start_conversion(input_file_var, output_folder_var, output_format_var, status_label):
-    input_file = input_file_var.get()
+def start_conversion(input_files, output_folder_var, output_format_var, profile_var, status_label, jobs):
     output_folder = output_folder_var.get()
     output_format = output_format_var.get()
     
-    if not input_file or not output_folder:
+    if not input_files or not output_folder:
         status_label.config(text="ERROR: Select both input file and output folder!", foreground="red")
         return
     
-    output_file = os.path.join(output_folder, f"{os.path.splitext(os.path.basename(input_file))[0]}_converted{output_format}")
-    
-    try:
-        convert_image(input_file, output_file, output_format)
-        status_label.config(text=f"SUCCESS: Converted to {output_format}!", foreground="green")
-        os.startfile(output_folder)
-    except Exception as e:
-        status_label.config(text=f"ERROR: {e}", foreground="red")
+    # Each file becomes a job on the worker pool, the window keeps responding while they run
+    for input_file in input_files:
+        output_file = get_output_path(input_file, output_folder, output_format)
+        jobs.submit(os.path.basename(input_file), input_file, output_file, output_format, None, None, None, profile_var.get())
+
+def job_failed(job):
+    # convert_job reports conversion errors in its result instead of raising
+    from job_queue import DONE
+    return job.error is not None or (job.status == DONE and job.result[1] != 0)
+
+def update_job(job, jobs, job_list, status_label, output_folder_var):
+    from job_queue import DONE
+    if job_failed(job):
+        text = f"{job.label}: failed ({job.error or job.result[2]})"
+    else:
+        text = f"{job.label}: {job.status}"
+
+    if job.id < job_list.size():
+        job_list.delete(job.id)
+    job_list.insert(job.id, text)
+    if job_failed(job):
+        job_list.itemconfig(job.id, foreground="red")
+
+    finished, total = jobs.progress()
+    if jobs.active():
+        status_label.config(text=f"Converting... {finished}/{total}", foreground="black")
+        return
+
+    converted = sum(1 for j in jobs.jobs if j.status == DONE and not job_failed(j))
+    if any(job_failed(j) for j in jobs.jobs):
+        status_label.config(text="ERROR: Some conversions failed!", foreground="red")
+    elif converted:
+        status_label.config(text=f"SUCCESS: Converted {converted} file(s)!", foreground="green")
+        os.startfile(output_folder_var.get())
+    else:
+        status_label.config(text="Conversion cancelled.", foreground="black")
 
 def main():
+    import tkinter as tk
+    from tkinter import StringVar, ttk
+    from job_queue import JobQueue
+
     app = tk.Tk()
     app.title("Image Converter")
     
-    width, height = 700, 400
+    width, height = 700, 680
     screen_width = app.winfo_screenwidth()
     screen_height = app.winfo_screenheight()
     x = (screen_width // 2) - (width // 2)
@@ -69,16 +335,18 @@ def main():
     app.geometry(f"{width}x{height}+{x}+{y}")
     app.configure(bg="#f0f0f0")
     
+    input_files = []
     input_file_var = StringVar()
     output_folder_var = StringVar()
     output_format_var = StringVar(value=".png")
+    profile_var = StringVar(value=DEFAULT_PROFILE)
     
     main_frame = ttk.Frame(app, padding=20)
     main_frame.pack(expand=True)
     
-    ttk.Label(main_frame, text="Select Input File:").pack(anchor="w", pady=5)
+    ttk.Label(main_frame, text="Select Input Files:").pack(anchor="w", pady=5)
     ttk.Entry(main_frame, textvariable=input_file_var, width=40, font=("Arial", 12), state='readonly').pack(pady=5)
-    ttk.Button(main_frame, text="Browse", command=lambda: select_input_file(input_file_var)).pack(pady=5)
+    ttk.Button(main_frame, text="Browse", command=lambda: select_input_files(input_files, input_file_var)).pack(pady=5)
     
     ttk.Label(main_frame, text="Select Output Folder:").pack(anchor="w", pady=5)
     ttk.Entry(main_frame, textvariable=output_folder_var, width=40, font=("Arial", 12), state='readonly').pack(pady=5)
@@ -87,13 +355,32 @@ def main():
     ttk.Label(main_frame, text="Select Output Format:").pack(anchor="w", pady=5)
     ttk.Combobox(main_frame, textvariable=output_format_var, values=SUPPORTED_EXTENSIONS, font=("Arial", 12), state='readonly').pack(pady=5)
     
-    convert_button = ttk.Button(main_frame, text="Convert", command=lambda: start_conversion(input_file_var, output_folder_var, output_format_var, status_label))
-    convert_button.pack(pady=20)
+    ttk.Label(main_frame, text="Encoder Profile:").pack(anchor="w", pady=5)
+    ttk.Combobox(main_frame, textvariable=profile_var, values=PROFILES, font=("Arial", 12), state='readonly').pack(pady=5)
+    
+    button_frame = ttk.Frame(main_frame)
+    button_frame.pack(pady=20)
+    convert_button = ttk.Button(button_frame, text="Convert", command=lambda: start_conversion(input_files, output_folder_var, output_format_var, profile_var, status_label, jobs))
+    convert_button.pack(side="left", padx=5)
+    ttk.Button(button_frame, text="Cancel", command=lambda: jobs.cancel()).pack(side="left", padx=5)
     
     status_label = ttk.Label(main_frame, text="", font=("Arial", 12, "bold"))
     status_label.pack(pady=5)
     
+    job_list = tk.Listbox(main_frame, width=60, height=6)
+    job_list.pack(pady=5)
+    
+    jobs = JobQueue(app, convert_job, on_update=lambda job: update_job(job, jobs, job_list, status_label, output_folder_var))
+    
+    def close():
+        jobs.shutdown()
+        app.destroy()
+    app.protocol("WM_DELETE_WINDOW", close)
+    
     app.mainloop()
 
 if __name__ == "__main__":
+    # Any command line argument switches to the headless batch mode
+    if len(sys.argv) > 1:
+        sys.exit(batch_main(sys.argv[1:]))
     main()
\ No newline at end of file
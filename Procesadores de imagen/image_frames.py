@@ -0,0 +1,77 @@
+import os
+from PIL import ImageSequence, TiffImagePlugin
+from instrumentation import NULL_INSTRUMENTATION
+
+# Modes each writer can store as they are. Images in any other mode are converted,
+# keeping the alpha channel only when the target format can hold it.
+SAVE_MODES = {
+    'JPEG': {'L', 'RGB', 'CMYK'},
+    'PNG': {'1', 'L', 'LA', 'I', 'I;16', 'P', 'RGB', 'RGBA'},
+    'GIF': {'1', 'L', 'P', 'RGB', 'RGBA'},
+    'BMP': {'1', 'L', 'P', 'RGB'},
+    'TIFF': {'1', 'L', 'LA', 'I', 'I;16', 'F', 'P', 'RGB', 'RGBA', 'CMYK', 'YCbCr'},
+    'WEBP': {'RGB', 'RGBA'},
+    'AVIF': {'RGB', 'RGBA'},
+}
+ALPHA_FORMATS = {'PNG', 'GIF', 'TIFF', 'WEBP', 'AVIF'}
+MULTIFRAME_FORMATS = {'GIF', 'PNG', 'TIFF', 'WEBP', 'AVIF'}
+
+def target_mode(img, format_name):
+    allowed = SAVE_MODES.get(format_name)
+    if allowed is None or img.mode in allowed:
+        return None
+    if format_name in ALPHA_FORMATS and img.has_transparency_data:
+        return 'RGBA'
+    return 'RGB'
+
+def prepare_frame(img, format_name):
+    mode = target_mode(img, format_name)
+    return img if mode is None else img.convert(mode)
+
+def raw_size(img):
+    return img.width * img.height * len(img.getbands())
+
+def output_size(output):
+    return output.tell() if hasattr(output, 'tell') else os.path.getsize(output)
+
+def save_image(img, output_path, format_name, instrument=None, **params):
+    instrument = instrument or NULL_INSTRUMENTATION
+    if getattr(img, 'n_frames', 1) == 1 or format_name not in MULTIFRAME_FORMATS:
+        with instrument.stage('convert', bytes_in=raw_size(img), mode=img.mode) as stage:
+            frame = prepare_frame(img, format_name)
+            stage.bytes_out = raw_size(frame)
+        with instrument.stage('encode', bytes_in=raw_size(frame), format=format_name) as stage:
+            frame.save(output_path, format_name, **params)
+            stage.bytes_out = output_size(output_path)
+        return
+
+    # Frames are decoded, converted and encoded one after another, so they share a single stage
+    with instrument.stage('encode', bytes_in=raw_size(img) * img.n_frames, format=format_name, frames=img.n_frames) as stage:
+        save_frames(img, output_path, format_name, **params)
+        stage.bytes_out = output_size(output_path)
+
+def frame_duration(frame):
+    frame.load()
+    return round(frame.info.get('duration', 0))
+
+def save_frames(img, output_path, format_name, **params):
+    if 'loop' in img.info:
+        params.setdefault('loop', img.info['loop'])
+
+    if format_name == 'TIFF':
+        # One page decoded, converted and written at a time
+        with TiffImagePlugin.AppendingTiffWriter(output_path, True) as tf:
+            for frame in ImageSequence.Iterator(img):
+                prepare_frame(frame, format_name).save(tf, format_name, **params)
+                tf.newFrame()
+        return
+
+    if format_name in ('WEBP', 'AVIF') and 'duration' not in params:
+        # The WebP and AVIF encoders only read the first frame's duration, collect them all up front.
+        # WebP and AVIF sources only set a frame's duration once it is loaded, not on seek. APNG
+        # durations are fractions of a millisecond, these encoders take whole ones.
+        params['duration'] = [frame_duration(frame) for frame in ImageSequence.Iterator(img)]
+
+    # GIF, APNG, WebP and AVIF writers pull the frames from the source one at a time and take each
+    # frame's duration from its info (GIF and APNG also keep the frames they need for delta encoding)
+    img.save(output_path, format_name, save_all=True, **params)
@@ -0,0 +1,89 @@
+import io
+import os
+import functools
+from PIL import Image
+from image_frames import ALPHA_FORMATS, raw_size, save_image
+from instrumentation import NULL_INSTRUMENTATION
+
+# Parses an SVG once and renders it as many times as needed (sizes, DPIs, formats) from the
+# same tree. Rasters are handed to Pillow in memory, so every Pillow output format works.
+current_dir = os.path.dirname(os.path.abspath(__file__))
+_cairosvg = None
+
+def load_cairosvg():
+    global _cairosvg
+    if _cairosvg is None:
+        if os.name == 'nt':
+            # Load Cairo library explicitly for SVG support
+            # Use custom path to the libcairo-2.dll file (bin folder has to be in the same directory as the script)
+            import ctypes
+            cairo_path = os.path.join(current_dir, "bin", "libcairo-2.dll")
+            ctypes.windll.LoadLibrary(cairo_path)
+        import cairosvg
+        _cairosvg = cairosvg
+    return _cairosvg
+
+class SvgDocument:
+    def __init__(self, path=None, bytestring=None):
+        load_cairosvg()
+        from cairosvg.parser import Tree
+        self.tree = Tree(url=path) if path is not None else Tree(bytestring=bytestring)
+
+    def render(self, surface_class, output, width=None, height=None, dpi=96, scale=1, background_color=None):
+        # Same arguments cairosvg's Surface.convert passes, minus the parsing
+        surface = surface_class(self.tree, output, dpi, None, None, None, scale, width, height, background_color)
+        surface.finish()
+
+    def render_png(self, width=None, height=None, dpi=96, scale=1, background_color=None):
+        from cairosvg.surface import PNGSurface
+        output = io.BytesIO()
+        self.render(PNGSurface, output, width, height, dpi, scale, background_color)
+        return output.getvalue()
+
+    def render_image(self, width=None, height=None, dpi=96, scale=1, background_color=None):
+        img = Image.open(io.BytesIO(self.render_png(width, height, dpi, scale, background_color)))
+        img.load()
+        return img
+
+    def render_pdf(self, output_path, width=None, height=None, dpi=96, scale=1):
+        from cairosvg.surface import PDFSurface
+        with open(output_path, 'wb') as f:
+            self.render(PDFSurface, f, width, height, dpi, scale)
+
+@functools.lru_cache(maxsize=32)
+def _load_svg(path, mtime_ns, size):
+    return SvgDocument(path)
+
+def load_svg(path):
+    # Keyed on mtime and size so an edited file is parsed again
+    stat = os.stat(path)
+    return _load_svg(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def rasterize(input_path, output_path, format_name, width=None, height=None, dpi=96, instrument=None, **params):
+    instrument = instrument or NULL_INSTRUMENTATION
+    with instrument.stage('parse', bytes_in=os.path.getsize(input_path)):
+        document = load_svg(input_path)
+    if format_name == 'PDF':
+        with instrument.stage('render', format=format_name) as stage:
+            document.render_pdf(output_path, width, height, dpi)
+            stage.bytes_out = os.path.getsize(output_path)
+        return
+    # Formats without alpha get a white background instead of black where the SVG is transparent
+    background_color = None if format_name in ALPHA_FORMATS else 'white'
+    with instrument.stage('render', width=width) as stage:
+        img = document.render_image(width, height, dpi, background_color=background_color)
+        stage.bytes_out = raw_size(img)
+    save_image(img, output_path, format_name, instrument, **params)
+
+def sized_output_path(output_path, width):
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_{width}px{ext}"
+
+def render_sizes(input_path, output_path, format_name, widths, dpi=96, **params):
+    # One parse, one render per width; the height follows the SVG's aspect ratio
+    output_paths = []
+    for width in widths:
+        sized_path = sized_output_path(output_path, width)
+        rasterize(input_path, sized_path, format_name, width=width, dpi=dpi, **params)
+        output_paths.append(sized_path)
+    return output_paths
@@ -0,0 +1,139 @@
+import os
+import json
+from PIL import Image
+from image_frames import raw_size, save_image
+from instrumentation import NULL_INSTRUMENTATION
+from svg_engine import load_svg
+
+# Textures for the AR clients. A mip pyramid is every power-of-two size of an image down to 1x1,
+# built from a single decode: JPEGs are decoded already scaled down with draft(), the rest is
+# reduced with box filters and each level is half of the one before. An atlas packs many small
+# images into a few power-of-two sheets and a JSON manifest says where each one ended up.
+
+"""MIP PYRAMID"""
+# Modes reduce() works on; palette, 1-bit, CMYK... images are converted once before halving
+REDUCE_MODES = {'L', 'LA', 'RGB', 'RGBA'}
+
+def floor_power_of_two(n):
+    return 1 << (max(int(n), 1).bit_length() - 1)
+
+def base_size(size, max_size=None):
+    # Largest power-of-two size that does not upscale, halved (keeping the aspect) until it fits max_size
+    width, height = (floor_power_of_two(d) for d in size)
+    while max_size and max(width, height) > max_size and max(width, height) > 1:
+        width, height = max(width // 2, 1), max(height // 2, 1)
+    return width, height
+
+def open_source(input_path, width=None):
+    if input_path.lower().endswith('.svg'):
+        return load_svg(input_path).render_image(width)
+    return Image.open(input_path)
+
+def iter_mip_levels(img, size):
+    if img.mode not in REDUCE_MODES:
+        img = img.convert('RGBA' if img.has_transparency_data else 'RGB')
+    # An integer reduce gets close to the base size cheaply, one resize makes it exact
+    factor = min(img.width // size[0], img.height // size[1])
+    if factor > 1:
+        img = img.reduce(factor)
+    if img.size != size:
+        img = img.resize(size, Image.LANCZOS)
+    yield img
+    while img.size != (1, 1):
+        img = img.reduce((2 if img.width > 1 else 1, 2 if img.height > 1 else 1))
+        yield img
+
+def mip_output_path(output_path, level, size):
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_mip{level}_{size[0]}x{size[1]}{ext}"
+
+def write_mip_pyramid(input_path, output_path, format_name, max_size=None, instrument=None, **params):
+    instrument = instrument or NULL_INSTRUMENTATION
+    output_paths = []
+    with open_source(input_path, max_size) as img:
+        size = base_size(img.size, max_size)
+        with instrument.stage('decode', bytes_in=os.path.getsize(input_path), format=img.format) as stage:
+            # Only JPEG can decode at a reduced scale; draft() has to come before the pixels are read
+            img.draft(None, size)
+            img.load()
+            stage.bytes_out = raw_size(img)
+        for level, mip in enumerate(iter_mip_levels(img, size)):
+            level_path = mip_output_path(output_path, level, mip.size)
+            save_image(mip, level_path, format_name, instrument, **params)
+            output_paths.append(level_path)
+    return output_paths
+
+"""TEXTURE ATLAS"""
+def pack_shelves(sizes, sheet_size, padding=0):
+    # Shelf packing: tallest images first, placed left to right on a shelf as tall as its first
+    # image; a full shelf opens the next one below it and a full sheet opens the next sheet.
+    # Returns (sheet, x, y) for every size, in the order given.
+    placements = [None] * len(sizes)
+    sheet, x, y, shelf_height = 0, padding, padding, 0
+    for i in sorted(range(len(sizes)), key=lambda i: (sizes[i][1], sizes[i][0]), reverse=True):
+        width, height = sizes[i]
+        if width + 2 * padding > sheet_size or height + 2 * padding > sheet_size:
+            raise ValueError(f"A {width}x{height} image does not fit in a {sheet_size}px atlas sheet")
+        if x + width + padding > sheet_size:
+            x, y, shelf_height = padding, y + shelf_height + padding, 0
+        if y + height + padding > sheet_size:
+            sheet, x, y, shelf_height = sheet + 1, padding, padding, 0
+        placements[i] = (sheet, x, y)
+        x += width + padding
+        shelf_height = max(shelf_height, height)
+    return placements
+
+def ceil_power_of_two(n):
+    return 1 << (max(int(n), 1) - 1).bit_length()
+
+def build_atlas(input_paths, output_folder, name='atlas', extension='.png', format_name='PNG', sheet_size=2048,
+                padding=2, max_size=None, instrument=None, **params):
+    # Padding keeps neighbouring images from bleeding into each other when the sheet is filtered or mip-mapped.
+    # Writes name_0.png, name_1.png... and name.json; returns the manifest's path.
+    instrument = instrument or NULL_INSTRUMENTATION
+    sheet_size = floor_power_of_two(sheet_size)
+    sprites = []
+    names = set()
+    with instrument.stage('decode', bytes_in=sum(os.path.getsize(path) for path in input_paths)) as stage:
+        for path in input_paths:
+            with open_source(path, max_size) as img:
+                if max_size and max(img.size) > max_size:
+                    img.thumbnail((max_size, max_size), Image.LANCZOS)
+                sprite = img.convert('RGBA')
+            sprite_name = os.path.splitext(os.path.basename(path))[0]
+            # Same file name in two folders: the later one gets a number
+            unique_name, n = sprite_name, 1
+            while unique_name in names:
+                unique_name, n = f"{sprite_name}_{n}", n + 1
+            names.add(unique_name)
+            sprites.append((unique_name, path, sprite))
+            stage.bytes_out += raw_size(sprite)
+
+    placements = pack_shelves([sprite.size for _, _, sprite in sprites], sheet_size, padding)
+    sheets = []
+    for index in range(max(sheet for sheet, _, _ in placements) + 1 if placements else 0):
+        members = [(sprite, x, y) for (_, _, sprite), (sheet, x, y) in zip(sprites, placements) if sheet == index]
+        # The last sheet is usually part empty, it is cut down to the smallest power of two that holds it
+        width = min(ceil_power_of_two(max(x + sprite.width + padding for sprite, x, _ in members)), sheet_size)
+        height = min(ceil_power_of_two(max(y + sprite.height + padding for sprite, _, y in members)), sheet_size)
+        with instrument.stage('pack', sheet=index, sprites=len(members)) as stage:
+            canvas = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+            for sprite, x, y in members:
+                canvas.paste(sprite, (x, y))
+            stage.bytes_out = raw_size(canvas)
+        file_name = f"{name}_{index}{extension}"
+        save_image(canvas, os.path.join(output_folder, file_name), format_name, instrument, **params)
+        sheets.append({'file': file_name, 'width': width, 'height': height})
+
+    manifest = {'origin': 'top-left', 'padding': padding, 'sheets': sheets, 'sprites': {}}
+    for (sprite_name, path, sprite), (sheet, x, y) in zip(sprites, placements):
+        width, height = sheets[sheet]['width'], sheets[sheet]['height']
+        manifest['sprites'][sprite_name] = {
+            'source': path, 'sheet': sheet, 'x': x, 'y': y, 'width': sprite.width, 'height': sprite.height,
+            # u0, v0, u1, v1 with (0, 0) at the top left corner of the sheet
+            'uv': [x / width, y / height, (x + sprite.width) / width, (y + sprite.height) / height],
+        }
+    manifest_path = os.path.join(output_folder, f"{name}.json")
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
@@ -0,0 +1,393 @@
+import os
+import zlib
+import struct
+import contextlib
+from PIL import Image, ImageFile
+from image_frames import raw_size
+from instrumentation import NULL_INSTRUMENTATION
+
+# Conversion of images too big to hold in memory (gigapixel scans). The source is read a band of
+# rows at a time, each band is converted to the output mode on its own and handed to a writer that
+# streams it to disk, so memory stays around the band budget whatever the size of the image.
+DEFAULT_BUDGET = 256 * 1024 * 1024
+
+"""BAND READER"""
+# Bits per pixel of the raw layouts whose rows can be located by offset without decoding
+RAW_BITS = {'1': 1, 'L': 8, 'P': 8, 'LA': 16, 'PA': 16, 'RGB': 24, 'RGBA': 32, 'RGBX': 32, 'CMYK': 32,
+            'I;16': 16, 'I;16B': 16, 'I;16L': 16, 'I;16N': 16, 'I': 32, 'F': 32}
+DEFLATE = (8, 32946)
+
+@contextlib.contextmanager
+def no_pixel_limit():
+    # Pillow refuses images this big as possible decompression bombs, but here the pixels are
+    # never all in memory at once
+    previous = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        yield
+    finally:
+        Image.MAX_IMAGE_PIXELS = previous
+
+def open_lazy(input_path):
+    # Opening only reads the header
+    with no_pixel_limit():
+        return Image.open(input_path)
+
+def make_tile(codec, extents, offset, args):
+    # Pillow 11 and later keep tiles as named tuples and read their fields by name
+    tile_class = getattr(ImageFile, '_Tile', None)
+    return tile_class(codec, extents, offset, args) if tile_class else (codec, extents, offset, args)
+
+def exceeds_pixel_limit(input_path):
+    if input_path.lower().endswith('.svg'):
+        return False
+    with open_lazy(input_path) as img:
+        return Image.MAX_IMAGE_PIXELS is not None and img.width * img.height > Image.MAX_IMAGE_PIXELS
+
+def tile_row_groups(tiles, height):
+    # Row ranges made of whole tiles (strips, or rows of tiles), or None if the tiles do not split the rows
+    rows = sorted({(extents[1], extents[3]) for _, extents, _, _ in tiles})
+    if len(rows) < 2 or rows[0][0] != 0 or rows[-1][1] != height:
+        return None
+    if any(bottom != next_top for (_, bottom), (next_top, _) in zip(rows, rows[1:])):
+        return None
+    return rows
+
+def deflate_strips(img):
+    # Deflate strip TIFFs go to libtiff as one tile for the whole image, but each strip is a zlib
+    # stream of its own and can be read and inflated here
+    if img.format != 'TIFF' or len(img.tile) != 1 or img.tile[0][0] != 'libtiff':
+        return None
+    tags = img.tag_v2
+    if (tags.get(259) not in DEFLATE or tags.get(317, 1) != 1 or tags.get(284, 1) != 1
+            or tags.get(266, 1) != 1 or 322 in tags):
+        return None
+    offsets, counts = tags.get(273), tags.get(279)
+    offsets = (offsets,) if isinstance(offsets, int) else offsets
+    counts = (counts,) if isinstance(counts, int) else counts
+    rows_per_strip = min(tags.get(278, img.height), img.height)
+    tops = range(0, img.height, rows_per_strip)
+    if not offsets or len(offsets) != len(tops) or len(counts) != len(tops):
+        return None
+    return [(top, min(top + rows_per_strip, img.height), offset, count) for top, offset, count in zip(tops, offsets, counts)]
+
+class BandReader:
+    # Decodes any band of rows that starts and ends on one of self.groups: the source's strips or
+    # rows of tiles, single rows of an uncompressed image, or Deflate TIFF strips. Anything else
+    # (PNG, JPEG, LZW TIFF...) has no independent parts and is decoded whole, once.
+    def __init__(self, input_path):
+        self.input_path = input_path
+        self.img = open_lazy(input_path)
+        self.width, self.height = self.img.size
+        self.mode = self.img.mode
+        self.tiles = list(self.img.tile)
+        self.strips = deflate_strips(self.img)
+        self.raw_stride = self.raw_row_stride()
+        self.whole = None
+        if self.strips is not None:
+            self.groups = [(top, bottom) for top, bottom, _, _ in self.strips]
+        elif self.raw_stride is not None:
+            self.groups = [(y, y + 1) for y in range(self.height)]
+        else:
+            self.groups = tile_row_groups(self.tiles, self.height)
+        self.banded = self.groups is not None
+        if not self.banded:
+            self.groups = [(y, y + 1) for y in range(self.height)]
+
+    def raw_row_stride(self):
+        # One uncompressed tile for the whole image (BMP, PPM, Pillow's own TIFFs): row y is at offset + y * stride
+        if len(self.tiles) != 1:
+            return None
+        name, extents, _, args = self.tiles[0]
+        if name != 'raw' or extents != (0, 0, self.width, self.height) or not isinstance(args, tuple) or len(args) < 3:
+            return None
+        rawmode, stride, orientation = args[:3]
+        if orientation not in (1, -1):
+            return None
+        if stride:
+            return stride
+        if rawmode != self.mode or rawmode not in RAW_BITS:
+            return None
+        return (self.width * RAW_BITS[rawmode] + 7) // 8
+
+    def read(self, top, bottom):
+        if self.strips is not None:
+            return self.read_strips(top, bottom)
+        if not self.banded:
+            if self.whole is None:
+                with no_pixel_limit():
+                    self.img.load()
+                self.whole = self.img
+            return self.whole.crop((0, top, self.width, bottom))
+
+        # A fresh image limited to the band: its size is the band's and its tiles are the ones
+        # inside the band, moved up to start at row 0
+        img = open_lazy(self.input_path)
+        if self.raw_stride is not None:
+            name, _, offset, args = self.tiles[0]
+            rawmode, _, orientation = args[:3]
+            # Bottom-up files (orientation -1) store the last row first
+            first_row = top if orientation == 1 else self.height - bottom
+            img.tile = [make_tile(name, (0, 0, self.width, bottom - top), offset + first_row * self.raw_stride,
+                                  (rawmode, self.raw_stride, orientation) + tuple(args[3:]))]
+        else:
+            img.tile = [make_tile(name, (x0, y0 - top, x1, y1 - top), offset, args)
+                        for name, (x0, y0, x1, y1), offset, args in self.tiles if top <= y0 and y1 <= bottom]
+        img._size = (self.width, bottom - top)
+        if hasattr(img, '_tile_size'):
+            # The TIFF plugin allocates the image from its own copy of the size
+            img._tile_size = img._size
+        with no_pixel_limit():
+            img.load()
+        return img
+
+    def read_strips(self, top, bottom):
+        data = bytearray()
+        with open(self.input_path, 'rb') as f:
+            for strip_top, strip_bottom, offset, count in self.strips:
+                if top <= strip_top and strip_bottom <= bottom:
+                    f.seek(offset)
+                    data += zlib.decompress(f.read(count))
+        band = Image.frombytes(self.mode, (self.width, bottom - top), bytes(data), 'raw', self.tiles[0][3][0])
+        palette = self.img.palette
+        if self.mode == 'P' and palette is not None:
+            # TIFF palettes are kept as read from the file (16-bit planar), with their raw mode
+            band.putpalette(palette.palette, palette.rawmode or palette.mode)
+            if 'transparency' in self.img.info:
+                band.info['transparency'] = self.img.info['transparency']
+        return band
+
+    def close(self):
+        self.img.close()
+
+def plan_bands(groups, row_bytes, budget):
+    # Consecutive groups are merged into bands of at most budget bytes; a group larger than the
+    # budget is still read whole, it cannot be split
+    bands = []
+    top = bottom = None
+    for group_top, group_bottom in groups:
+        if top is not None and (group_bottom - top) * row_bytes > budget:
+            bands.append((top, bottom))
+            top = None
+        if top is None:
+            top = group_top
+        bottom = group_bottom
+    if top is not None:
+        bands.append((top, bottom))
+    return bands
+
+def pixel_bytes(mode):
+    return max(RAW_BITS.get(mode, 32) // 8, 1)
+
+def output_mode(img, format_name):
+    if img.mode in ('L', 'LA', 'RGB', 'RGBA'):
+        return img.mode
+    if img.mode == '1':
+        return 'L'
+    # Scans with more than 8 bits per sample keep them: 16 bits in both formats, 32 bits in TIFF only
+    if img.mode.startswith('I;16'):
+        return 'I;16'
+    if img.mode in ('I', 'F'):
+        if format_name == 'TIFF':
+            return img.mode
+        if img.mode == 'F':
+            raise ValueError("32-bit float images can only be converted band by band to TIFF")
+        return 'I;16'
+    return 'RGBA' if img.has_transparency_data else 'RGB'
+
+def convert_band(band, mode):
+    if band.mode == mode:
+        return band
+    if mode == 'I;16':
+        if band.mode.startswith('I;16'):
+            # Pillow converts between 16-bit layouts through 8 bits; only the byte order differs, so the
+            # samples are read again in the other order instead
+            rawmode = 'I;16' if band.mode == 'I;16L' else band.mode
+            return Image.frombytes('I;16', band.size, band.tobytes(), 'raw', rawmode)
+        # 32-bit integers into a PNG: converting clips, refuse instead of changing the samples
+        low, high = band.getextrema()
+        if low < 0 or high > 0xFFFF:
+            raise ValueError(f"Samples from {low} to {high} do not fit in a 16-bit PNG, convert to TIFF instead")
+    return band.convert(mode)
+
+"""WRITERS"""
+STRIP_BYTES = 256 * 1024
+IDAT_BYTES = 1024 * 1024
+# Raw sizes above this are written as BigTIFF, Deflate can make a strip slightly larger than its data
+BIGTIFF_THRESHOLD = 0xF0000000
+
+SHORT, LONG, LONG8 = 3, 4, 16
+TIFF_TYPES = {SHORT: 'H', LONG: 'I', LONG8: 'Q'}
+# Output mode -> (samples per pixel, bits per sample, TIFF SampleFormat: 1 unsigned, 2 signed, 3 float,
+# Pillow raw mode giving the samples little-endian like the file)
+SAMPLE_LAYOUTS = {
+    'L': (1, 8, 1, 'L'),
+    'LA': (2, 8, 1, 'LA'),
+    'RGB': (3, 8, 1, 'RGB'),
+    'RGBA': (4, 8, 1, 'RGBA'),
+    'I;16': (1, 16, 1, 'I;16'),
+    'I': (1, 32, 2, 'I;32S'),
+    'F': (1, 32, 3, 'F;32F'),
+}
+
+def encode_ifd(entries, ifd_offset, bigtiff):
+    # entries: (tag, type, values) sorted by tag. Values that do not fit in the entry go after the directory.
+    count_format, entry_format, inline = ('<Q', '<HHQ', 8) if bigtiff else ('<H', '<HHI', 4)
+    pointer_format = '<Q' if bigtiff else '<I'
+    data_offset = ifd_offset + struct.calcsize(count_format) + len(entries) * (struct.calcsize(entry_format) + inline) + inline
+    head = [struct.pack(count_format, len(entries))]
+    extra = []
+    for tag, kind, values in entries:
+        packed = struct.pack(f"<{len(values)}{TIFF_TYPES[kind]}", *values)
+        head.append(struct.pack(entry_format, tag, kind, len(values)))
+        if len(packed) <= inline:
+            head.append(packed.ljust(inline, b'\0'))
+        else:
+            head.append(struct.pack(pointer_format, data_offset))
+            extra.append(packed)
+            data_offset += len(packed)
+    # No next directory
+    head.append(b'\0' * inline)
+    return b''.join(head + extra)
+
+class TiffStripWriter:
+    # Baseline TIFF written strip by strip, each strip Deflate compressed on its own. The directory
+    # with the strip offsets is written at the end, once they are all known, and the header is
+    # patched to point at it.
+    def __init__(self, output_path, size, mode, compression='deflate', bigtiff=None):
+        self.output_path = output_path
+        self.width, self.height = size
+        self.mode = mode
+        self.samples, self.bits, self.sample_format, self.rawmode = SAMPLE_LAYOUTS[mode]
+        self.row_bytes = self.width * self.samples * self.bits // 8
+        self.rows_per_strip = max(1, STRIP_BYTES // self.row_bytes)
+        self.compress = compression == 'deflate'
+        self.bigtiff = self.row_bytes * self.height > BIGTIFF_THRESHOLD if bigtiff is None else bigtiff
+        self.pending = bytearray()
+        self.offsets = []
+        self.counts = []
+        self.f = open(output_path, 'wb')
+        self.f.write(b'II+\0' + struct.pack('<HHQ', 8, 0, 0) if self.bigtiff else b'II*\0' + struct.pack('<I', 0))
+
+    def write(self, band):
+        self.pending += band.tobytes('raw', self.rawmode)
+        strip_bytes = self.rows_per_strip * self.row_bytes
+        start = 0
+        while len(self.pending) - start >= strip_bytes:
+            self.write_strip(self.pending[start:start + strip_bytes])
+            start += strip_bytes
+        del self.pending[:start]
+
+    def write_strip(self, data):
+        if self.compress:
+            data = zlib.compress(data, 6)
+        self.offsets.append(self.f.tell())
+        self.counts.append(len(data))
+        self.f.write(data)
+
+    def close(self):
+        if self.pending:
+            self.write_strip(bytes(self.pending))
+            self.pending.clear()
+        if self.f.tell() % 2:
+            # The directory starts on a word boundary
+            self.f.write(b'\0')
+        ifd_offset = self.f.tell()
+        offset_type = LONG8 if self.bigtiff else LONG
+        entries = [
+            (256, LONG, [self.width]),
+            (257, LONG, [self.height]),
+            (258, SHORT, [self.bits] * self.samples),
+            (259, SHORT, [8 if self.compress else 1]),
+            (262, SHORT, [2 if self.samples >= 3 else 1]),
+            (273, offset_type, self.offsets),
+            (277, SHORT, [self.samples]),
+            (278, LONG, [self.rows_per_strip]),
+            (279, offset_type, self.counts),
+            (284, SHORT, [1]),
+        ]
+        if self.mode in ('LA', 'RGBA'):
+            # Unassociated alpha
+            entries.append((338, SHORT, [2]))
+        if self.sample_format != 1:
+            entries.append((339, SHORT, [self.sample_format] * self.samples))
+        self.f.write(encode_ifd(entries, ifd_offset, self.bigtiff))
+        self.f.seek(8 if self.bigtiff else 4)
+        self.f.write(struct.pack('<Q' if self.bigtiff else '<I', ifd_offset))
+        self.f.close()
+
+    def abort(self):
+        self.f.close()
+        os.remove(self.output_path)
+
+class PngStreamWriter:
+    # Rows go through one zlib stream and come out as IDAT chunks. Rows are not filtered: choosing
+    # a filter per row in Python would cost more than the few percent of size it saves.
+    # Mode -> (color type, bit depth, Pillow raw mode giving the samples big-endian like PNG)
+    LAYOUTS = {'L': (0, 8, 'L'), 'LA': (4, 8, 'LA'), 'RGB': (2, 8, 'RGB'), 'RGBA': (6, 8, 'RGBA'), 'I;16': (0, 16, 'I;16B')}
+
+    def __init__(self, output_path, size, mode, compress_level=6):
+        self.output_path = output_path
+        width, height = size
+        color_type, bit_depth, self.rawmode = self.LAYOUTS[mode]
+        self.row_bytes = width * Image.getmodebands(mode) * bit_depth // 8
+        self.compressor = zlib.compressobj(compress_level)
+        self.buffer = bytearray()
+        self.f = open(output_path, 'wb')
+        self.f.write(b'\x89PNG\r\n\x1a\n')
+        self.write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, 0))
+
+    def write(self, band):
+        data = band.tobytes('raw', self.rawmode)
+        compress = self.compressor.compress
+        for start in range(0, len(data), self.row_bytes):
+            # Filter type 0 (none) before every row
+            self.buffer += compress(b'\0' + data[start:start + self.row_bytes])
+        if len(self.buffer) >= IDAT_BYTES:
+            self.write_chunk(b'IDAT', self.buffer)
+            self.buffer.clear()
+
+    def write_chunk(self, kind, data):
+        self.f.write(struct.pack('>I', len(data)) + kind)
+        self.f.write(data)
+        self.f.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    def close(self):
+        self.buffer += self.compressor.flush()
+        self.write_chunk(b'IDAT', self.buffer)
+        self.write_chunk(b'IEND', b'')
+        self.f.close()
+
+    def abort(self):
+        self.f.close()
+        os.remove(self.output_path)
+
+WRITERS = {'TIFF': TiffStripWriter, 'PNG': PngStreamWriter}
+
+def convert_tiled(input_path, output_path, format_name, budget=DEFAULT_BUDGET, instrument=None):
+    instrument = instrument or NULL_INSTRUMENTATION
+    if format_name not in WRITERS:
+        raise ValueError(f"Tiled conversion writes TIFF or PNG, not {format_name}")
+    reader = BandReader(input_path)
+    try:
+        mode = output_mode(reader.img, format_name)
+        # Per row: the decoded band, the converted band and the bytes handed to the writer
+        row_bytes = reader.width * (pixel_bytes(reader.mode) + 2 * pixel_bytes(mode))
+        writer = WRITERS[format_name](output_path, reader.img.size, mode)
+        try:
+            for top, bottom in plan_bands(reader.groups, row_bytes, budget):
+                with instrument.stage('decode', rows=bottom - top, banded=reader.banded) as stage:
+                    band = reader.read(top, bottom)
+                    stage.bytes_out = raw_size(band)
+                with instrument.stage('convert', bytes_in=raw_size(band), mode=band.mode) as stage:
+                    band = convert_band(band, mode)
+                    stage.bytes_out = raw_size(band)
+                with instrument.stage('encode', bytes_in=raw_size(band), format=format_name):
+                    writer.write(band)
+                band = None
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+    finally:
+        reader.close()
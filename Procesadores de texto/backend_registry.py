@@ -0,0 +1,46 @@
+import importlib
+from collections.abc import Mapping
+
+class BackendRegistry(Mapping):
+    # Maps an extension to a reader or writer. A backend can be registered as a callable or as a
+    # 'module:function' string, which is only imported the first time its extension is looked up.
+    def __init__(self, backends=None):
+        self._specs = {}
+        self._loaded = {}
+        for ext, backend in (backends or {}).items():
+            self.register(ext, backend)
+
+    def register(self, ext, backend):
+        ext = ext.lower()
+        self._specs[ext] = backend
+        self._loaded.pop(ext, None)
+
+    def backend(self, *exts):
+        # Decorator form, for plugins: @READERS.backend('.md')
+        def decorator(func):
+            for ext in exts:
+                self.register(ext, func)
+            return func
+        return decorator
+
+    def is_loaded(self, ext):
+        return ext.lower() in self._loaded
+
+    def __getitem__(self, ext):
+        ext = ext.lower()
+        if ext not in self._loaded:
+            backend = self._specs[ext]
+            if isinstance(backend, str):
+                module_name, _, attr = backend.partition(':')
+                backend = getattr(importlib.import_module(module_name), attr)
+            self._loaded[ext] = backend
+        return self._loaded[ext]
+
+    def __iter__(self):
+        return iter(self._specs)
+
+    def __len__(self):
+        return len(self._specs)
+
+    def __contains__(self, ext):
+        return ext.lower() in self._specs
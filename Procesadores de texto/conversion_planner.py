@@ -0,0 +1,118 @@
+import heapq
+import itertools
+
+# Formats are the nodes of a graph and backends are its edges: a native reader goes from a format
+# to plain text (TEXT), a native writer from plain text to a format, pandoc goes straight from one
+# format to another and a copy from a format to itself. Each edge has an estimated cost in seconds
+# (fixed + per MB of input) and the planner picks the cheapest route from the input to the output
+# among those that keep the document's structure, if there is any.
+TEXT = 'text'
+
+# Rough figures measured on this project's documents, in (seconds, seconds per MB of input)
+READ_COSTS = {
+    '.txt': (0.0, 0.01),
+    '.docx': (0.02, 4.0),
+    '.odt': (0.02, 4.0),
+    '.pdf': (0.02, 6.0),
+    '.rtf': (0.01, 2.0),
+    '.html': (0.01, 3.0),
+    '.doc': (0.2, 6.0),
+}
+WRITE_COSTS = {
+    '.txt': (0.0, 0.01),
+    '.docx': (0.05, 1.5),
+    '.odt': (0.02, 0.3),
+    '.pdf': (0.02, 1.0),
+    '.rtf': (0.0, 0.3),
+    '.html': (0.0, 0.05),
+}
+COPY_COST = (0.0, 0.01)
+PANDOC_COST = (0.05, 10.0)
+# Formats pandoc can read and write, with pandoc's names. Plain .txt is not read through pandoc,
+# it would be parsed as markdown and change the text. RTF is only written by pandoc: its RTF reader
+# turns the surrogate pairs of characters outside the BMP (emoji, rare CJK) into U+FFFD, so RTF
+# input always goes through rtf_codec.
+PANDOC_READS = {'.docx': 'docx', '.odt': 'odt', '.html': 'html'}
+PANDOC_WRITES = {'.docx': 'docx', '.odt': 'odt', '.html': 'html', '.rtf': 'rtf', '.txt': 'plain'}
+# Formats with headings, lists, tables... that plain text cannot hold. A route that drops them
+# only wins when every route does (docx -> txt), whatever the size of the document.
+STRUCTURED = {'.docx', '.odt', '.html', '.rtf'}
+
+class Edge:
+    def __init__(self, source, target, kind, fixed_cost=0.0, cost_per_mb=0.0, lossy=False):
+        self.source = source
+        self.target = target
+        self.kind = kind
+        self.fixed_cost = fixed_cost
+        self.cost_per_mb = cost_per_mb
+        self.lossy = lossy
+
+    def cost(self, size_mb):
+        return self.fixed_cost + self.cost_per_mb * size_mb
+
+    def __repr__(self):
+        return f"{self.source} -> {self.target} ({self.kind})"
+
+class Plan:
+    def __init__(self, steps, cost):
+        self.steps = steps
+        self.cost = cost
+
+    @property
+    def kinds(self):
+        return [step.kind for step in self.steps]
+
+    @property
+    def lossy(self):
+        return any(step.lossy for step in self.steps)
+
+    def describe(self):
+        route = ' -> '.join([self.steps[0].source] + [f"{step.target} [{step.kind}]" for step in self.steps])
+        lossy = ', drops structure' if self.lossy else ''
+        return f"{route} (cost {self.cost:.2f}{lossy})"
+
+class ConversionPlanner:
+    def __init__(self):
+        self.edges = {}
+
+    def add_edge(self, source, target, kind, fixed_cost=0.0, cost_per_mb=0.0, lossy=False):
+        self.edges.setdefault(source, []).append(Edge(source, target, kind, fixed_cost, cost_per_mb, lossy))
+
+    def plan(self, source, target, size=0, exclude=()):
+        # Dijkstra from the input format; a route has at least one edge, so .txt -> .txt is a copy.
+        # Routes are ranked by (drops structure, cost): adding a step never makes either better,
+        # so the first route to reach a node is still the best one.
+        size_mb = size / (1024 * 1024)
+        counter = itertools.count()
+        heap = []
+        for edge in self.edges.get(source, []):
+            if edge.kind not in exclude:
+                heapq.heappush(heap, (edge.lossy, edge.cost(size_mb), next(counter), [edge]))
+        settled = set()
+        while heap:
+            lossy, cost, _, steps = heapq.heappop(heap)
+            node = steps[-1].target
+            if node == target:
+                return Plan(steps, cost)
+            if node in settled:
+                continue
+            settled.add(node)
+            for edge in self.edges.get(node, []):
+                if edge.kind not in exclude and edge.target not in settled:
+                    heapq.heappush(heap, (lossy or edge.lossy, cost + edge.cost(size_mb), next(counter), steps + [edge]))
+        return None
+
+def build_planner(readers, writers, pandoc=False):
+    planner = ConversionPlanner()
+    for ext in readers:
+        planner.add_edge(ext, TEXT, 'read', *READ_COSTS.get(ext, (0.1, 5.0)), lossy=ext in STRUCTURED)
+    for ext in writers:
+        planner.add_edge(TEXT, ext, 'write', *WRITE_COSTS.get(ext, (0.1, 5.0)))
+    for ext in set(readers) | set(writers):
+        planner.add_edge(ext, ext, 'copy', *COPY_COST)
+    if pandoc:
+        for source in PANDOC_READS:
+            for target in PANDOC_WRITES:
+                if source != target:
+                    planner.add_edge(source, target, 'pandoc', *PANDOC_COST, lossy=target not in STRUCTURED)
+    return planner
@@ -1,59 +1,53 @@
 import os
 import sys
-import pdfplumber
-import docx
-import pypandoc
-from bs4 import BeautifulSoup
+import atexit
+# Los módulos que comparten los conversores de imagen y de texto están en Compartido
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Compartido'))
+# read_docx lee word/document.xml por partes, sin cargar el documento entero
+from xml_readers import read_docx
+# read_html convierte el HTML en texto mientras lo lee, sin construir el árbol del documento
+from html_extractor import read_html
+# read_txt detecta la codificación (BOM, UTF-8 o cp1252) y lee el archivo por bloques de líneas
+from txt_reader import read_txt
+# read_pdf reparte los PDF largos por rangos de páginas entre varios procesos; lee cada página con
+# PyPDF2 y solo vuelve a leer con pdfplumber las que salen vacías o ilegibles
+from pdf_extract import read_pdf
+from pandoc_pool import PandocPool
+from job_queue import JobQueue, DONE, FAILED
 import tkinter as tk
-from tkinter import filedialog, messageboxe
-
-def read_txt(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return file.read()
-
-def read_pdf(file_path):
-    text = ""
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() + '\n'
-    return text
-
-def read_docx(file_path):
-    doc = docx.Document(file_path)
-    return '\n'.join([p.text for p in doc.paragraphs])
-
-def read_html(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        soup = BeautifulSoup(file, 'html.parser')
-        return soup.get_text()
-
-def convert_text(text, output_format, output_path):
-    try:
-        if output_format == "txt":
-            with open(output_path, 'w', encoding='utf-8') as file:
-                file.write(text)
-        elif output_format in ["docx", "odt", "rtf", "html"]:
-            pypandoc.convert_text(text, output_format, format="md", outputfile=output_path)
-        messagebox.showinfo("Conversión exitosa", f"Archivo convertido y guardado en: {output_path}")
-    except Exception as e:
-        messagebox.showerror("Error", f"Error en la conversión: {e}")
+from tkinter import filedialog, messagebox
+
+# Procesos de pandoc que se mantienen abiertos entre conversiones, se arrancan con la primera
+pandoc_pool = PandocPool(workers=2, timeout=120)
+atexit.register(pandoc_pool.close)
+
+# Las conversiones corren en segundo plano, los errores se lanzan y la interfaz los muestra
+def convert_text(chunks, output_format, output_path):
+    if output_format == "txt":
+        with open(output_path, 'w', encoding='utf-8') as file:
+            for chunk in chunks:
+                file.write(chunk)
+    elif output_format in ["docx", "odt", "rtf", "html"]:
+        pandoc_pool.convert(''.join(chunks), output_format, input_format="md", outputfile=output_path)
+    else:
+        raise ValueError("Formato no soportado para escritura.")
+    return output_path
 
 def convert_file(input_path, output_format, output_path):
     ext = os.path.splitext(input_path)[1].lower()
     
     if ext == ".txt":
-        text = read_txt(input_path)
+        chunks = read_txt(input_path)
     elif ext == ".pdf":
-        text = read_pdf(input_path)
+        chunks = read_pdf(input_path)
     elif ext in [".doc", ".docx"]:
-        text = read_docx(input_path)
+        chunks = read_docx(input_path)
     elif ext == ".html":
-        text = read_html(input_path)
+        chunks = read_html(input_path)
     else:
-        messagebox.showerror("Error", "Formato no soportado para lectura.")
-        return
+        raise ValueError("Formato no soportado para lectura.")
     
-    convert_text(text, output_format, output_path)
+    return convert_text(chunks, output_format, output_path)
 
 def open_file():
     file_path = filedialog.askopenfilename(filetypes=[("Todos los archivos", "*.*")])
@@ -74,28 +68,50 @@ def start_conversion():
         messagebox.showwarning("Advertencia", "Por favor, selecciona un archivo de entrada y una ruta de salida.")
         return
     
-    convert_file(input_file, output_format, output_file)
+    jobs.submit(os.path.basename(input_file), input_file, output_format, output_file)
+
+def update_job(job):
+    if job.id < job_list.size():
+        job_list.delete(job.id)
+    job_list.insert(job.id, f"{job.label}: {ESTADOS[job.status]}")
+
+    if job.status == DONE:
+        messagebox.showinfo("Conversión exitosa", f"Archivo convertido y guardado en: {job.result}")
+    elif job.status == FAILED:
+        job_list.itemconfig(job.id, foreground="red")
+        messagebox.showerror("Error", f"Error en la conversión: {job.error}")
+
+def close():
+    jobs.shutdown()
+    root.destroy()
+
+# Los procesos de extracción de PDF vuelven a importar este script, la interfaz solo se abre al ejecutarlo
+if __name__ == "__main__":
+    # Interfaz gráfica
+    root = tk.Tk()
+    root.title("Conversor de Archivos de Texto")
+    root.geometry("500x400")
 
-# Interfaz gráfica
-root = tk.Tk()
-root.title("Conversor de Archivos de Texto")
-root.geometry("500x250")
+    tk.Label(root, text="Archivo de Entrada:").pack()
+    entry_input = tk.Entry(root, width=50)
+    entry_input.pack()
+    tk.Button(root, text="Abrir", command=open_file).pack()
 
-tk.Label(root, text="Archivo de Entrada:").pack()
-entry_input = tk.Entry(root, width=50)
-entry_input.pack()
-tk.Button(root, text="Abrir", command=open_file).pack()
+    tk.Label(root, text="Archivo de Salida:").pack()
+    entry_output = tk.Entry(root, width=50)
+    entry_output.pack()
+    tk.Button(root, text="Guardar como", command=save_file).pack()
 
-tk.Label(root, text="Archivo de Salida:").pack()
-entry_output = tk.Entry(root, width=50)
-entry_output.pack()
-tk.Button(root, text="Guardar como", command=save_file).pack()
+    tk.Button(root, text="Convertir", command=start_conversion).pack()
+    tk.Button(root, text="Cancelar pendientes", command=lambda: jobs.cancel()).pack()
 
-tk.Button(root, text="Convertir", command=start_conversion).pack()
+    job_list = tk.Listbox(root, width=60, height=6)
+    job_list.pack(pady=10)
 
-if pypandoc.get_pandoc_path() is None:
-    print("Descargando Pandoc...")
-    pypandoc.download_pandoc()
+    ESTADOS = {'queued': 'en cola', 'running': 'convirtiendo', 'done': 'listo', 'failed': 'error', 'cancelled': 'cancelado'}
 
+    # Hilos en lugar de procesos: el trabajo pesado lo hace pandoc en sus propios procesos
+    jobs = JobQueue(root, convert_file, on_update=update_job, max_workers=2, use_processes=False)
+    root.protocol("WM_DELETE_WINDOW", close)
 
-root.mainloop()
+    root.mainloop()
@@ -0,0 +1,142 @@
+import io
+import re
+import codecs
+from html.parser import HTMLParser
+from txt_reader import BOMS, SNIFF_SIZE, sniff_encoding
+
+# Turns HTML into plain text while it is being read: the file is fed to html.parser in chunks and
+# the text found so far is handed on after each one, so no document tree is ever built.
+CHUNK_SIZE = 1024 * 1024
+
+# Content that is not text
+SKIP_TAGS = {'script', 'style', 'template'}
+# Tags that start a new line, and those that also leave a blank line around them
+LINE_TAGS = {
+    'div', 'li', 'tr', 'dt', 'dd', 'title', 'section', 'article', 'header', 'footer', 'nav',
+    'aside', 'main', 'figure', 'figcaption', 'address', 'form', 'fieldset', 'caption', 'details',
+    'summary', 'option',
+}
+PARAGRAPH_TAGS = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'blockquote', 'table', 'ul', 'ol', 'dl', 'hr'}
+CELL_TAGS = {'td', 'th'}
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="text/html; charset=...">
+META_CHARSET = re.compile(rb'<meta[^>]*?charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+# Declared encodings browsers read as something else: latin-1 pages are really cp1252, and a page
+# without a BOM cannot be UTF-16 or UTF-32 if its <meta> could be read as ASCII
+DECLARED_ENCODINGS = {'iso8859-1': 'cp1252', 'ascii': 'cp1252'}
+DECLARED_ENCODINGS.update(dict.fromkeys(['utf-16', 'utf-16-le', 'utf-16-be', 'utf-32', 'utf-32-le', 'utf-32-be'], 'utf-8'))
+
+class HtmlTextExtractor(HTMLParser):
+    def __init__(self):
+        # Entities (&amp;, &#233;...) are decoded by the parser before handle_data sees the text
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+        self.pre_depth = 0
+        self.started = False
+        self.pending_newlines = 0
+        self.pending_separator = ''
+        self.cells_in_row = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == 'br':
+            self.pending_newlines = min(self.pending_newlines + 1, 2)
+        elif tag in CELL_TAGS:
+            if self.cells_in_row:
+                self.pending_separator = '\t'
+            self.cells_in_row += 1
+        else:
+            self.block(tag)
+            if tag == 'pre':
+                self.pre_depth += 1
+            elif tag == 'tr':
+                self.cells_in_row = 0
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif tag not in CELL_TAGS and tag != 'br':
+            self.block(tag)
+            if tag == 'pre':
+                self.pre_depth = max(self.pre_depth - 1, 0)
+
+    def block(self, tag):
+        if tag in PARAGRAPH_TAGS:
+            self.pending_newlines = 2
+        elif tag in LINE_TAGS:
+            self.pending_newlines = max(self.pending_newlines, 1)
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.pre_depth:
+            self.emit(data)
+            return
+        # Outside <pre> any run of whitespace is a single space, as a browser shows it
+        words = data.split()
+        if data[:1].isspace() and not self.pending_separator:
+            self.pending_separator = ' '
+        if words:
+            self.emit(' '.join(words))
+            self.pending_separator = ' ' if data[-1].isspace() else ''
+
+    def emit(self, text):
+        if self.started:
+            if self.pending_newlines:
+                self.parts.append('\n' * self.pending_newlines)
+            elif self.pending_separator:
+                self.parts.append(self.pending_separator)
+        self.pending_newlines = 0
+        self.pending_separator = ''
+        self.started = True
+        self.parts.append(text)
+
+    def take(self):
+        text = ''.join(self.parts)
+        self.parts.clear()
+        return text
+
+def extract_text(chunks):
+    parser = HtmlTextExtractor()
+    for chunk in chunks:
+        parser.feed(chunk)
+        text = parser.take()
+        if text:
+            yield text
+    parser.close()
+    text = parser.take()
+    if text:
+        yield text
+
+def sniff_html_encoding(prefix):
+    # A BOM first, then the page's own <meta> declaration, then the same guess as for plain text
+    # (UTF-8 if the first bytes decode as such, cp1252 otherwise)
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    match = META_CHARSET.search(prefix)
+    if match:
+        try:
+            encoding = codecs.lookup(match.group(1).decode('ascii')).name
+            return DECLARED_ENCODINGS.get(encoding, encoding)
+        except LookupError:
+            pass
+    return sniff_encoding(prefix)
+
+def read_chunks(file_path):
+    with open(file_path, 'rb') as f:
+        data = f.read(SNIFF_SIZE)
+        # Undecodable bytes become U+FFFD instead of failing the conversion; \r\n and \r become \n
+        decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(sniff_html_encoding(data))('replace'), True)
+        while data:
+            chunk = decoder.decode(data)
+            if chunk:
+                yield chunk
+            data = f.read(CHUNK_SIZE)
+        chunk = decoder.decode(b'', True)
+        if chunk:
+            yield chunk
+
+def read_html(file_path):
+    return extract_text(read_chunks(file_path))
@@ -0,0 +1,237 @@
+import os
+import queue
+import tempfile
+import threading
+import subprocess
+import functools
+from concurrent.futures import Future
+
+# Keeps a few `pandoc lua` processes running and feeds them documents over stdin/stdout, so each
+# conversion no longer pays for starting pandoc. Pandoc builds without `pandoc lua -e` fall back
+# to one pypandoc call per document, with the same bounded queue and timeouts.
+#
+# Protocol, one request at a time per worker:
+#   -> "<from> <to> <length>\n<output path>\n" followed by <length> bytes of UTF-8 text
+#   -> "<from> <to> @\n<output path>\n<input path>\n" to have pandoc read the input file itself
+#   <- "OK\n" or "ERR <message>\n"
+# The worker reads input files and writes the result itself, which keeps binary formats (docx, odt)
+# away from the pipes.
+WORKER_SCRIPT = r'''
+-- The pandoc command line always renders binary formats standalone, pandoc.write only does it with a template
+local templates = {}
+local function writer_options(to)
+  if to ~= 'odt' then return {} end
+  if not templates[to] then
+    templates[to] = pandoc.template.compile(pandoc.template.default(to))
+  end
+  return {template = templates[to]}
+end
+
+io.write('READY\n')
+io.stdout:flush()
+while true do
+  local header = io.read('l')
+  if not header then break end
+  local from, to, length = header:match('^(%S+) (%S+) (%S+)$')
+  local output_path = io.read('l')
+  local input_path, text
+  if length == '@' then
+    input_path = io.read('l')
+  else
+    text = io.read(tonumber(length)) or ''
+  end
+  local ok, err = pcall(function()
+    if input_path then
+      local f = assert(io.open(input_path, 'rb'))
+      text = f:read('a')
+      f:close()
+    end
+    local result = pandoc.write(pandoc.read(text, from), to, writer_options(to))
+    local f = assert(io.open(output_path, 'wb'))
+    f:write(result)
+    f:close()
+  end)
+  if ok then
+    io.write('OK\n')
+  else
+    io.write('ERR ' .. tostring(err):gsub('[\r\n]+', ' ') .. '\n')
+  end
+  io.stdout:flush()
+end
+'''
+
+@functools.lru_cache(maxsize=None)
+def ensure_pandoc():
+    # Replaces the download check that used to run on every import of converter-aldo
+    import pypandoc
+    try:
+        path = pypandoc.get_pandoc_path()
+    except OSError:
+        path = None
+    if path is None:
+        print("Descargando Pandoc...")
+        pypandoc.download_pandoc()
+        path = pypandoc.get_pandoc_path()
+    return path
+
+@functools.lru_cache(maxsize=None)
+def pandoc_available():
+    # Unlike ensure_pandoc this never downloads anything
+    try:
+        import pypandoc
+        pypandoc.get_pandoc_path()
+        return True
+    except (ImportError, OSError):
+        return False
+
+def _pandoc_format(fmt):
+    return 'markdown' if fmt == 'md' else fmt
+
+class PandocError(Exception):
+    pass
+
+class PandocWorker:
+    def __init__(self, pandoc):
+        # The script goes on the command line, worker processes that never run atexit leave no files behind
+        self.process = subprocess.Popen([pandoc, 'lua', '-e', WORKER_SCRIPT], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if self.process.stdout.readline() != b'READY\n':
+            self.close()
+            raise PandocError("This pandoc has no lua subcommand")
+
+    def convert(self, text, output_format, input_format, outputfile, timeout, inputfile=None):
+        if inputfile is not None:
+            data = b''
+            header = f"{_pandoc_format(input_format)} {_pandoc_format(output_format)} @\n{os.path.abspath(outputfile)}\n{os.path.abspath(inputfile)}\n"
+        else:
+            data = text.replace('\r\n', '\n').encode('utf-8')
+            header = f"{_pandoc_format(input_format)} {_pandoc_format(output_format)} {len(data)}\n{os.path.abspath(outputfile)}\n"
+        # A stuck conversion is killed, which also unblocks the readline below
+        timer = threading.Timer(timeout, self.process.kill)
+        timer.start()
+        try:
+            self.process.stdin.write(header.encode('utf-8') + data)
+            self.process.stdin.flush()
+            reply = self.process.stdout.readline().decode('utf-8', 'replace')
+        except OSError:
+            reply = ''
+        finally:
+            timer.cancel()
+        if not reply:
+            raise PandocError(f"Pandoc did not answer within {timeout} seconds")
+        if not reply.startswith('OK'):
+            raise PandocError(reply[4:].strip())
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def close(self):
+        if self.alive():
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+class PandocPool:
+    def __init__(self, workers=2, queue_size=32, timeout=60):
+        self.workers = workers
+        self.timeout = timeout
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.threads = []
+        self.started = False
+
+    def start(self):
+        if self.started:
+            return self
+        self.threads = [threading.Thread(target=self._serve, daemon=True) for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+        self.started = True
+        return self
+
+    def submit(self, text, output_format, input_format='md', outputfile=None, inputfile=None):
+        self.start()
+        future = Future()
+        try:
+            # Bounded queue: callers wait (up to the timeout) instead of piling up work
+            self.jobs.put((future, text, output_format, input_format, outputfile, inputfile), timeout=self.timeout)
+        except queue.Full:
+            raise PandocError("Pandoc queue is full")
+        return future
+
+    def convert(self, text, output_format, input_format='md', outputfile=None):
+        return self.submit(text, output_format, input_format, outputfile).result()
+
+    def convert_path(self, inputfile, output_format, input_format, outputfile):
+        # Pandoc reads the file itself, binary formats (docx, odt) included
+        return self.submit(None, output_format, input_format, outputfile, inputfile).result()
+
+    def convert_batch(self, documents, output_format, input_format='md'):
+        # documents: list of (text, outputfile); they are spread over the warm workers
+        futures = [self.submit(text, output_format, input_format, outputfile) for text, outputfile in documents]
+        return [future.result() for future in futures]
+
+    def close(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self.started = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _serve(self):
+        worker = None
+        fallback = False
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            future, text, output_format, input_format, outputfile, inputfile = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if worker is None and not fallback:
+                    try:
+                        worker = PandocWorker(ensure_pandoc())
+                    except PandocError:
+                        fallback = True
+                if fallback:
+                    import pypandoc
+                    if inputfile is not None:
+                        future.set_result(pypandoc.convert_file(inputfile, output_format, format=input_format, outputfile=outputfile))
+                    else:
+                        future.set_result(pypandoc.convert_text(text, output_format, format=input_format, outputfile=outputfile))
+                else:
+                    future.set_result(self._convert(worker, text, output_format, input_format, outputfile, inputfile))
+            except Exception as e:
+                future.set_exception(e)
+            if worker is not None and not worker.alive():
+                # Killed after a timeout, the next job starts a fresh one
+                worker = None
+        if worker is not None:
+            worker.close()
+
+    def _convert(self, worker, text, output_format, input_format, outputfile, inputfile=None):
+        if outputfile is not None:
+            worker.convert(text, output_format, input_format, outputfile, self.timeout, inputfile)
+            return ''
+        # Without an output file the result goes through a temporary one, like pypandoc returns it
+        fd, tmp_path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            worker.convert(text, output_format, input_format, tmp_path, self.timeout, inputfile)
+            with open(tmp_path, 'rb') as f:
+                data = f.read()
+        finally:
+            os.remove(tmp_path)
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            return data
@@ -0,0 +1,181 @@
+import os
+import re
+import atexit
+import threading
+import collections
+import contextlib
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# PDF text extraction split by page ranges. Long documents are spread over a pool of processes,
+# each one opening the file on its own and extracting a range of pages; the ranges come back in
+# page order and every one is yielded as soon as the ranges before it are done. Short documents,
+# and extraction that already runs inside a worker process, stay sequential.
+#
+# The 'auto' engine reads every page with PyPDF2, which is fast, checks the text it got and only
+# re-extracts the pages that look wrong with pdfplumber, which is accurate but several times slower.
+# Every engine yields (text, engine that produced it) for each page.
+PAGES_PER_RANGE = 16
+# Below this many pages starting the pool costs more than it saves
+MIN_PARALLEL_PAGES = 48
+# Ranges submitted ahead of the one being yielded, per worker
+RANGES_AHEAD = 2
+
+# A page is re-extracted when its text is empty, when more than this share of it is unreadable
+# (replacement characters, private use glyphs, control codes, pdfminer's '(cid:N)'), or when its
+# words are this long on average, which is what PyPDF2 gives when it misses the spaces
+MAX_GARBAGE_RATIO = 0.05
+MAX_MEAN_WORD_LENGTH = 20
+GARBAGE = re.compile(r'[\ufffd\ue000-\uf8ff\x00-\x08\x0b\x0e-\x1f]|\(cid:\d+\)')
+
+def page_problem(text):
+    stripped = text.strip()
+    if not stripped:
+        return 'empty'
+    garbage = sum(len(match) for match in GARBAGE.findall(stripped))
+    if garbage > MAX_GARBAGE_RATIO * len(stripped):
+        return 'garbage'
+    words = stripped.split()
+    if len(stripped) > 200 and len(stripped) > MAX_MEAN_WORD_LENGTH * len(words):
+        return 'no spaces'
+    return None
+
+def iter_pages_pypdf2(file_path, start=0, stop=None):
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for page in reader.pages[start:stop]:
+            # Pages without a text layer (scans) give None
+            yield page.extract_text() or '', 'pypdf2'
+
+def iter_pages_pdfplumber(file_path, start=0, stop=None):
+    import pdfplumber
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages[start:stop]:
+            yield page.extract_text() or '', 'pdfplumber'
+            # pdfplumber keeps the objects of every page it has read, free them once done
+            page.flush_cache()
+
+def iter_pages_auto(file_path, start=0, stop=None):
+    # Without one of the two libraries there is nothing to choose from
+    if importlib.util.find_spec('PyPDF2') is None:
+        yield from iter_pages_pdfplumber(file_path, start, stop)
+        return
+    if importlib.util.find_spec('pdfplumber') is None:
+        yield from iter_pages_pypdf2(file_path, start, stop)
+        return
+
+    import PyPDF2
+    with contextlib.ExitStack() as stack:
+        reader = PyPDF2.PdfReader(stack.enter_context(open(file_path, 'rb')))
+        accurate = None
+        for number, page in enumerate(reader.pages[start:stop], start):
+            text = page.extract_text() or ''
+            if page_problem(text) is None:
+                yield text, 'pypdf2'
+                continue
+            if accurate is None:
+                # Only opened once a page needs it
+                import pdfplumber
+                accurate = stack.enter_context(pdfplumber.open(file_path))
+            retry = accurate.pages[number]
+            retried = retry.extract_text() or ''
+            retry.flush_cache()
+            # A scanned page is empty either way, keep PyPDF2's text unless pdfplumber found some
+            if retried.strip() or not text.strip():
+                yield retried, 'pdfplumber'
+            else:
+                yield text, 'pypdf2'
+
+ENGINES = {
+    'pypdf2': iter_pages_pypdf2,
+    'pdfplumber': iter_pages_pdfplumber,
+    'auto': iter_pages_auto,
+}
+
+def count_pages(file_path, engine):
+    if engine == 'pdfplumber' or importlib.util.find_spec('PyPDF2') is None:
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            return len(pdf.pages)
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+def extract_range(file_path, engine, start, stop):
+    return list(ENGINES[engine](file_path, start, stop))
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def get_pool(workers):
+    # One pool for the whole program, started on the first long PDF. Spawned rather than forked:
+    # the GUIs call this from worker threads, and forking a threaded process is not safe.
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+atexit.register(close_pool)
+
+def extract_pages(file_path, engine='auto', workers=None):
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and multiprocessing.parent_process() is not None:
+        # Already in a worker process (batch mode), the documents themselves are the parallel units
+        workers = 1
+    pages = count_pages(file_path, engine) if workers > 1 else 0
+    if pages < MIN_PARALLEL_PAGES:
+        yield from ENGINES[engine](file_path)
+        return
+
+    pool = get_pool(workers)
+    ranges = iter(range(0, pages, PAGES_PER_RANGE))
+    pending = collections.deque()
+    try:
+        while True:
+            # Keep a bounded window of ranges in flight so finished ones do not pile up in memory
+            while len(pending) < workers * RANGES_AHEAD:
+                start = next(ranges, None)
+                if start is None:
+                    break
+                pending.append(pool.submit(extract_range, file_path, engine, start, min(start + PAGES_PER_RANGE, pages)))
+            if not pending:
+                break
+            yield from pending.popleft().result()
+    finally:
+        # The consumer may stop early (a writer error), drop what has not started yet
+        for future in pending:
+            future.cancel()
+
+def read_pdf(file_path, engine='auto', workers=None, report=None):
+    # report, if given, is filled with page number -> engine that extracted it
+    for number, (text, used) in enumerate(extract_pages(file_path, engine, workers), 1):
+        if report is not None:
+            report[number] = used
+        yield text + '\n'
+
+def describe_engines(report, max_pages=20):
+    # e.g. "PDF pages by engine: pypdf2 58, pdfplumber 5 (pages 3, 9, 12, 40, 41)"
+    counts = collections.Counter(report.values())
+    parts = []
+    for i, (engine, count) in enumerate(counts.most_common()):
+        part = f"{engine} {count}"
+        if i:
+            # The pages of every engine but the main one
+            pages = [str(number) for number, used in report.items() if used == engine]
+            listed = ', '.join(pages[:max_pages]) + (', ...' if len(pages) > max_pages else '')
+            part += f" (pages {listed})"
+        parts.append(part)
+    return f"PDF pages by engine: {', '.join(parts) or 'none'}"
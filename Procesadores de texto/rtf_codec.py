@@ -0,0 +1,240 @@
+import re
+import codecs
+
+# Native RTF reader and writer. The writer escapes text chunk by chunk, straight into the output
+# file; the reader tokenizes the file as it is read, so neither side ever holds the whole document.
+CHUNK_SIZE = 1024 * 1024
+
+"""ENCODER"""
+RTF_HEADER = b'{\\rtf1\\ansi\\ansicpg1252\\deff0\\uc1{\\fonttbl{\\f0\\fswiss Arial;}}\\pard\\f0\\fs24\n'
+RTF_FOOTER = b'}\n'
+
+class EscapeTable(dict):
+    # Code point -> RTF bytes, used by codecs.charmap_encode so the lookups run in C. ASCII is
+    # filled in up front; any other character gets its \uN ? escape the first time it shows up. The
+    # space ends the number as in pandoc's writer, some readers take '?' and the next character as one.
+    def __init__(self):
+        super().__init__({code: bytes([code]) for code in range(32, 128)})
+        self.update({code: b'' for code in range(32)})
+        self.update({ord('\\'): b'\\\\', ord('{'): b'\\{', ord('}'): b'\\}', ord('\n'): b'\\par\n',
+                     ord('\t'): b'\\tab ', ord('\f'): b'\\page\n'})
+
+    def __missing__(self, code):
+        if code > 0xFFFF:
+            # Outside the BMP: a UTF-16 surrogate pair, one \u per half
+            pair = code - 0x10000
+            escape = f"\\u{0xD800 + (pair >> 10) - 0x10000} ?\\u{0xDC00 + (pair & 0x3FF) - 0x10000} ?"
+        else:
+            # \u takes a signed 16-bit number
+            escape = f"\\u{code - 0x10000 if code > 0x7FFF else code} ?"
+        self[code] = escape.encode('ascii')
+        return self[code]
+
+ESCAPES = EscapeTable()
+
+def encode_rtf(text):
+    return codecs.charmap_encode(text, 'strict', ESCAPES)[0]
+
+def write_rtf(chunks, file_path):
+    with open(file_path, 'wb') as f:
+        f.write(RTF_HEADER)
+        for chunk in chunks:
+            f.write(encode_rtf(chunk))
+        f.write(RTF_FOOTER)
+
+"""DECODER"""
+# Text tokens take in the \uN ? escapes (\uN? from other writers) between plain characters, so
+# accented or CJK text does not go through the token loop one character at a time
+TOKEN = re.compile(r"((?:[^\\{}\r\n]+|\\u-?\d{1,6} ?\?)+)|\\([a-zA-Z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-fA-F]{2})|\\(.)|([{}])|[\r\n]+", re.S)
+UNICODE_ESCAPE = re.compile(r"\\u(-?\d{1,6}) ?\?")
+SURROGATE = re.compile('[\ud800-\udfff]')
+# A \'hh escape cut by the end of the chunk
+INCOMPLETE_HEX = re.compile(r"\\'[0-9a-fA-F]?\Z")
+
+# Groups whose content is not document text
+DESTINATIONS = {
+    'fonttbl', 'colortbl', 'stylesheet', 'info', 'pict', 'object', 'header', 'headerl', 'headerr',
+    'headerf', 'footer', 'footerl', 'footerr', 'footerf', 'themedata', 'colorschememapping',
+    'datastore', 'latentstyles', 'listtable', 'listoverridetable', 'rsidtbl', 'generator',
+    'xmlnstbl', 'mmathPr', 'filetbl', 'revtbl', 'fldinst', 'pntext', 'pntxta', 'pntxtb',
+    'private', 'userprops', 'wgrffmtfilter', 'xmlopen', 'passwordhash', 'docvar',
+}
+CONTROL_TEXT = {
+    'par': '\n', 'line': '\n', 'sect': '\n', 'page': '\n', 'row': '\n', 'tab': '\t', 'cell': '\t',
+    'emdash': '\u2014', 'endash': '\u2013', 'bullet': '\u2022', 'lquote': '\u2018', 'rquote': '\u2019',
+    'ldblquote': '\u201c', 'rdblquote': '\u201d', 'emspace': '\u2003', 'enspace': '\u2002',
+}
+SYMBOL_TEXT = {'\\': '\\', '{': '{', '}': '}', '~': '\u00a0', '_': '\u2011', '-': '', '\n': '\n', '\r': '\n'}
+
+class RtfDecoder:
+    def __init__(self):
+        self.buffer = ''
+        # Per group: (skip its text, \uc value)
+        self.stack = []
+        self.skip = False
+        self.uc = 1
+        self.skip_chars = 0
+        self.bin_bytes = 0
+        self.codepage = 'cp1252'
+        self.pending_bytes = bytearray()
+        self.high_surrogate = None
+        self.expect_destination = False
+
+    def feed(self, data, final=False):
+        out = []
+        buffer = self.buffer + data
+        consumed = 0
+        if self.bin_bytes:
+            # \binN data is raw, skip it without tokenizing
+            consumed = min(self.bin_bytes, len(buffer))
+            self.bin_bytes -= consumed
+
+        end = len(buffer)
+        if not final:
+            incomplete = INCOMPLETE_HEX.search(buffer, max(consumed, end - 3))
+            end = incomplete.start() if incomplete else end
+
+        for match in TOKEN.finditer(buffer, consumed, end):
+            text, word, param, hex_byte, symbol, brace = match.groups()
+            if not final and word is not None and match.end() >= end - 1 and buffer[match.end():end] in ('', '-'):
+                # A control word touching the end of the chunk may still get more letters or digits
+                break
+            consumed = match.end()
+            if match.group()[0] in '\r\n':
+                continue
+            if hex_byte is not None:
+                self.hex_byte(int(hex_byte, 16))
+                continue
+            self.flush_bytes(out)
+            if word is not None:
+                self.control_word(word, param, out)
+                if word == 'bin' and param:
+                    self.bin_bytes = int(param)
+                    self.buffer = ''
+                    return ''.join(out) + self.feed(buffer[consumed:], final)
+            elif text is not None:
+                self.expect_destination = False
+                self.text(text, out)
+            elif brace == '{':
+                self.stack.append((self.skip, self.uc))
+                self.expect_destination = True
+            elif brace == '}':
+                if self.stack:
+                    self.skip, self.uc = self.stack.pop()
+                self.expect_destination = False
+            elif symbol is not None:
+                if symbol == '*':
+                    # {\* ...} is an optional destination, ignored by readers that do not know it
+                    self.skip = True
+                elif symbol in SYMBOL_TEXT:
+                    self.text_out(SYMBOL_TEXT[symbol], out)
+                self.expect_destination = False
+        if final:
+            self.flush_bytes(out)
+        # Whatever is left is an unfinished token, at most a control word or a lone backslash
+        self.buffer = buffer[consumed:]
+        return ''.join(out)
+
+    def control_word(self, word, param, out):
+        first_in_group = self.expect_destination
+        self.expect_destination = False
+        if word in DESTINATIONS and first_in_group:
+            self.skip = True
+        elif word == 'ansicpg' and param:
+            try:
+                codecs.lookup(f"cp{param}")
+                self.codepage = f"cp{param}"
+            except LookupError:
+                pass
+        elif word == 'uc' and param:
+            self.uc = int(param)
+        elif word == 'u' and param:
+            code = int(param)
+            self.char(code + 0x10000 if code < 0 else code, out)
+            self.skip_chars = self.uc
+        elif word in CONTROL_TEXT:
+            self.text_out(CONTROL_TEXT[word], out)
+
+    def char(self, code, out):
+        if 0xD800 <= code < 0xDC00:
+            self.high_surrogate = code
+            return
+        if 0xDC00 <= code < 0xE000 and self.high_surrogate is not None:
+            code = 0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self.high_surrogate = None
+        self.text_out(chr(code), out)
+
+    def hex_byte(self, value):
+        if self.skip_chars:
+            # The fallback for the preceding \uN
+            self.skip_chars -= 1
+            return
+        self.pending_bytes.append(value)
+
+    def flush_bytes(self, out):
+        # Consecutive \'hh bytes are decoded together, double-byte codepages need both halves
+        if self.pending_bytes:
+            self.text_out(self.pending_bytes.decode(self.codepage, 'replace'), out)
+            self.pending_bytes.clear()
+
+    def text(self, text, out):
+        if '\\' not in text:
+            self.plain_text(text, out)
+            return
+        # Alternating plain text and \uN numbers
+        parts = UNICODE_ESCAPE.split(text)
+        if self.uc != 1:
+            # The '?' after each escape is not (only) its fallback, go one escape at a time
+            for i, part in enumerate(parts):
+                if i % 2:
+                    self.control_word('u', part, out)
+                    self.plain_text('?', out)
+                else:
+                    self.plain_text(part, out)
+            return
+        self.plain_text(parts[0], out)
+        self.skip_chars = 0
+        pieces = []
+        for i in range(1, len(parts), 2):
+            pieces.append(chr(int(parts[i]) & 0xFFFF))
+            pieces.append(parts[i + 1] if parts[i + 1].isascii() else self.from_codepage(parts[i + 1]))
+        decoded = ''.join(pieces)
+        if self.high_surrogate is not None:
+            decoded = chr(self.high_surrogate) + decoded
+            self.high_surrogate = None
+        if SURROGATE.search(decoded):
+            # Characters outside the BMP come as surrogate pairs, the second half may be in the next token
+            if '\ud800' <= decoded[-1] < '\udc00':
+                self.high_surrogate = ord(decoded[-1])
+                decoded = decoded[:-1]
+            decoded = decoded.encode('utf-16-le', 'surrogatepass').decode('utf-16-le', 'replace')
+        self.text_out(decoded, out)
+
+    def plain_text(self, text, out):
+        if self.skip_chars:
+            dropped = min(self.skip_chars, len(text))
+            self.skip_chars -= dropped
+            text = text[dropped:]
+        if text and not text.isascii():
+            text = self.from_codepage(text)
+        self.text_out(text, out)
+
+    def from_codepage(self, text):
+        # Raw 8-bit bytes are in the document's codepage; the file was read as latin-1
+        return text.encode('latin-1').decode(self.codepage, 'replace')
+
+    def text_out(self, text, out):
+        if not self.skip and text:
+            out.append(text)
+
+def read_rtf(file_path):
+    decoder = RtfDecoder()
+    # latin-1 maps every byte to one character, \'hh and 8-bit text are decoded by the codepage later
+    with open(file_path, 'r', encoding='latin-1', newline='') as f:
+        while True:
+            data = f.read(CHUNK_SIZE)
+            text = decoder.feed(data, final=not data)
+            if text:
+                yield text
+            if not data:
+                break
@@ -1,86 +1,94 @@
 import os
-import tkinter as tk
-from tkinter import Tk, Label, Button, filedialog, StringVar, OptionMenu, filedialog, StringVar, ttk
-from docx import Document as DocxDocument
-from odf.opendocument import OpenDocumentText, load
-from odf.text import P
-from striprtf.striprtf import rtf_to_text
-from bs4 import BeautifulSoup
-import PyPDF2
-from reportlab.lib.pagesizes import LETTER
-from reportlab.pdfgen import canvas
-import textract
-from PyRTF.Elements import Document as RTFDocument, Section as RTFSection, Text as RTFText
-from PyRTF.Renderer import Renderer, Paragraph as RTFParagraph
-import pypandoc
-import re
-
+import sys
+import glob
+import shutil
+import tempfile
+import functools
+import contextlib
+# Modules shared by the image and text converters live in Compartido
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Compartido'))
+from backend_registry import BackendRegistry
+from conversion_cache import ConversionCache
+from conversion_planner import PANDOC_READS, PANDOC_WRITES, build_planner
+from instrumentation import NULL_INSTRUMENTATION, Instrumentation, print_summary, summarize
+
+# Backends (python-docx, odfpy, PyPDF2, reportlab, ...) and tkinter are imported inside the functions
+# that use them, so a conversion only pays for the libraries its formats need.
 SUPPORTED_EXTENSIONS = ['.txt', '.doc', '.docx', '.pdf', '.rtf', '.html', '.odt']
 
 """READ FUNCTIONS"""
-def read_txt(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return f.read()
+# Readers are generators that yield text chunks (a page, a paragraph or a block of the file)
+# so writers can start producing output before the whole document has been read.
 
-def read_docx(file_path):
-    doc = DocxDocument(file_path)
-    return '\n'.join(p.text for p in doc.paragraphs)
+class ReadError(Exception):
+    pass
 
 def read_pdf(file_path):
-    text = ""
-    with open(file_path, 'rb') as f:
-        reader = PyPDF2.PdfReader(f)
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
-
-def read_rtf(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return rtf_to_text(f.read())
-
-def read_html(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        soup = BeautifulSoup(f, 'html.parser')
-        return soup.get_text()
-
-def read_odt(file_path):
-    doc = load(file_path)
-    text = ""
-    for paragraph in doc.getElementsByType(P):
-        for node in paragraph.childNodes:
-            if node.nodeType == node.TEXT_NODE:
-                text += node.data
-        text += '\n'
-    return text
+    # PyPDF2 first, pdfplumber for the pages PyPDF2 got wrong; says which engine read each page
+    from pdf_extract import describe_engines, read_pdf as extract_pdf
+    engines = {}
+    yield from extract_pdf(file_path, report=engines)
+    print(describe_engines(engines))
 
 def read_doc(file_path):
+    import textract
     try:
         text = textract.process(file_path).decode('utf-8')
-        return text
+        yield text
+    except Exception as e:
+        yield f"Error reading DOC file: {e}"
+
+def guard_reader(chunks):
+    # Reader errors show up while the writer is iterating, tag them so convert_file can tell them apart
+    try:
+        yield from chunks
     except Exception as e:
-        return f"Error reading DOC file: {e}"
+        raise ReadError(e) from e
+
+def iter_lines(chunks):
+    pending = ''
+    for chunk in chunks:
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        yield from lines
+    yield pending
+
+def iter_paragraphs(chunks):
+    pending = ''
+    for chunk in chunks:
+        paragraphs = (pending + chunk).split('\n\n')
+        pending = paragraphs.pop()
+        yield from paragraphs
+    yield pending
 
 """WRITE FUNCTIONS"""
-def write_txt(text, file_path):
+def write_txt(chunks, file_path):
     with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(text)
+        for chunk in chunks:
+            f.write(chunk)
 
-def write_docx(text, file_path):
+def write_docx(chunks, file_path):
+    from docx import Document as DocxDocument
     doc = DocxDocument()
-    for line in text.split('\n'):
+    for line in iter_lines(chunks):
         doc.add_paragraph(line)
     doc.save(file_path)
 
-def write_odt(text, file_path):
+def write_odt(chunks, file_path):
+    from odf.opendocument import OpenDocumentText
+    from odf.text import P
     doc = OpenDocumentText()
-    doc.text.addElement(P(text=text))
+    for line in iter_lines(chunks):
+        doc.text.addElement(P(text=line))
     doc.save(file_path)
 
-def write_pdf(text, file_path):
+def write_pdf(chunks, file_path):
+    from reportlab.lib.pagesizes import LETTER
+    from reportlab.pdfgen import canvas
     pdf = canvas.Canvas(file_path, pagesize=LETTER)
     width, height = LETTER
     y = height - 40
-    for line in text.split('\n'):
+    for line in iter_lines(chunks):
         pdf.drawString(40, y, line)
         y -= 15
         if y < 40:
@@ -88,124 +96,319 @@ def write_pdf(text, file_path):
             y = height - 40
     pdf.save()
 
-def write_rtf(text, file_path):
-    def escape_rtf(txt):
-        txt = txt.replace('\\', '\\\\').replace('{', '\\{').replace('}', '\\}')
-        txt = re.sub(r'([\u0080-\uffff])', lambda m: r'\u{}?'.format(ord(m.group(1))), text)
-        return txt
-
-    doc = RTFDocument()
-    section = RTFSection()
-    doc.Sections.append(section)
-    
-    paragraph = RTFParagraph()
-    paragraph.append(RTFText(escape_rtf(text)))
-    section.append(paragraph)
-
-    renderer = Renderer()
-    
-    with open(file_path, 'w', encoding='utf-8') as fout:
-        renderer.Write(doc, fout)
-
-def write_html(text, file_path):
+def write_html(chunks, file_path):
     with open(file_path, 'w', encoding='utf-8') as f:
         f.write('<html><body>')
-        for paragraph in text.split('\n\n'):
+        for paragraph in iter_paragraphs(chunks):
             f.write('<p>')
             f.write(paragraph.replace('\n', '<br>'))
             f.write('</p>')
         f.write('</body></html>')
 
-READERS = {
-    '.txt': read_txt,
-    '.docx': read_docx,
+# DOCX and ODT are streamed straight from the zip, see xml_readers; RTF has its own codec in rtf_codec
+# and HTML is turned into text as it is parsed, see html_extractor. Plain text is memory-mapped and
+# decoded a block of lines at a time, see txt_reader. PDFs go through pdf_extract, which extracts
+# long documents by page ranges in parallel
+READERS = BackendRegistry({
+    '.txt': 'txt_reader:read_txt',
+    '.docx': 'xml_readers:read_docx',
     '.pdf': read_pdf,
-    '.rtf': read_rtf,
-    '.html': read_html,
-    '.odt': read_odt,
+    '.rtf': 'rtf_codec:read_rtf',
+    '.html': 'html_extractor:read_html',
+    '.odt': 'xml_readers:read_odt',
     '.doc': read_doc
-}
+})
 
-WRITERS = {
+WRITERS = BackendRegistry({
     '.txt': write_txt,
     '.docx': write_docx,
     '.pdf': write_pdf,
-    '.rtf': write_rtf,
+    '.rtf': 'rtf_codec:write_rtf',
     '.html': write_html,
     '.odt': write_odt
-}
+})
+
+def remove_partial_output(output_file):
+    # Writers open the output before the reader has finished, don't leave half-written files behind
+    if os.path.exists(output_file):
+        os.remove(output_file)
+
+"""CONVERSION PLANNING"""
+# Each job takes the cheapest route the planner finds: a copy, a single pandoc call that keeps the
+# document's structure, or a native reader -> plain text -> writer pass.
+@functools.lru_cache(maxsize=None)
+def get_planner():
+    from pandoc_pool import pandoc_available
+    return build_planner(READERS, WRITERS, pandoc_available())
+
+_pandoc_pool = None
+
+def get_pandoc_pool():
+    global _pandoc_pool
+    if _pandoc_pool is None:
+        import atexit
+        from pandoc_pool import PandocPool
+        _pandoc_pool = PandocPool(workers=1, timeout=120)
+        atexit.register(_pandoc_pool.close)
+    return _pandoc_pool
+
+def plan_conversion(input_file, output_format, exclude=()):
+    ext = os.path.splitext(input_file)[1].lower()
+    return get_planner().plan(ext, output_format, os.path.getsize(input_file), exclude)
 
-def convert_file(input_file, output_format, output_folder):
+def run_plan(plan, input_file, output_file, instrument=None):
+    instrument = instrument or NULL_INSTRUMENTATION
+    current = input_file
+    temp_files = []
+    try:
+        for i, step in enumerate(plan.steps):
+            if step.kind == 'read':
+                # Nothing runs yet, the writer pulls the chunks
+                current = instrument.timed_iter('read', guard_reader(READERS[step.source](current)), os.path.getsize(current))
+                continue
+
+            if i == len(plan.steps) - 1:
+                target_file = output_file
+            else:
+                fd, target_file = tempfile.mkstemp(suffix=step.target)
+                os.close(fd)
+                temp_files.append(target_file)
+
+            if step.kind == 'write':
+                # Reading and writing interleave; the time spent pulling chunks is recorded as 'read' and left out of 'write'
+                with instrument.stage('write', exclude=current if instrument.enabled else None, format=step.target) as stage:
+                    WRITERS[step.target](current, target_file)
+                    stage.bytes_out = os.path.getsize(target_file)
+            elif step.kind == 'pandoc':
+                with instrument.stage('pandoc', bytes_in=os.path.getsize(current), format=step.target) as stage:
+                    get_pandoc_pool().convert_path(current, PANDOC_WRITES[step.target], PANDOC_READS[step.source], target_file)
+                    stage.bytes_out = os.path.getsize(target_file)
+            else:
+                with instrument.stage('copy', bytes_in=os.path.getsize(current)) as stage:
+                    shutil.copyfile(current, target_file)
+                    stage.bytes_out = os.path.getsize(target_file)
+            current = target_file
+    finally:
+        for path in temp_files:
+            remove_partial_output(path)
+
+def get_output_path(input_file, output_folder, output_format):
+    return os.path.join(output_folder, f"{os.path.splitext(os.path.basename(input_file))[0]}_converted{output_format}")
+
+def convert_file(input_file, output_format, output_folder, cache=None, instrument=None):
+    from pandoc_pool import PandocError
+    instrument = instrument or NULL_INSTRUMENTATION
     ext = os.path.splitext(input_file)[1].lower()
-    reader = READERS.get(ext)
-    
-    if not reader:
-        print(f"No reader implemented for '{ext}' files.")
-        return 1
-    
-    # Manage error when reading the file
-    text = ""
     try:
-        text = reader(input_file)
-    except Exception as e:
+        plan = plan_conversion(input_file, output_format)
+    except OSError as e:
         print(f"Error reading file: {e}")
         return 1
 
-    output_file = os.path.join(output_folder, f"{os.path.splitext(os.path.basename(input_file))[0]}_converted{output_format}")
-    
-    writer = WRITERS.get(output_format)
-    
-    if not writer:
-        print(f"No writer implemented for '{output_format}' files.")
+    if not plan:
+        if ext not in READERS:
+            print(f"No reader implemented for '{ext}' files.")
+        else:
+            print(f"No writer implemented for '{output_format}' files.")
         return 1
-    
-    # Manage error when writing the file
+
+    output_file = get_output_path(input_file, output_folder, output_format)
+
+    # Unchanged inputs are served from the cache under the usual _converted name. The reader is picked
+    # by extension, so the same bytes as .txt and as .html are different conversions
+    if cache is not None:
+        try:
+            with instrument.stage('cache', bytes_in=os.path.getsize(input_file)) as stage:
+                key = cache.make_key(input_file, output_format, {'input': ext})
+                stage.fields['hit'] = cache.fetch(key, output_format, output_file)
+        except OSError as e:
+            print(f"Error reading file: {e}")
+            return 1
+        if stage.fields['hit']:
+            print(f"Conversion complete (cached)! File saved to: {output_file}")
+            return 0
+
+    # The reader is consumed by the writer, so both kinds of error surface here
     try:
-        writer(text, output_file)
+        try:
+            run_plan(plan, input_file, output_file, instrument)
+        except PandocError as e:
+            # Documents pandoc cannot handle still get the plain text conversion
+            plan = plan_conversion(input_file, output_format, exclude=('pandoc',))
+            if not plan:
+                raise
+            print(f"Pandoc failed ({e}), converting through plain text.")
+            remove_partial_output(output_file)
+            run_plan(plan, input_file, output_file, instrument)
+    except ImportError as e:
+        print(f"Missing dependency for this conversion: {e}")
+        remove_partial_output(output_file)
+        return 1
+    except ReadError as e:
+        print(f"Error reading file: {e}")
+        remove_partial_output(output_file)
+        return 1
     except Exception as e:
         print(f"Error writing file: {e}")
+        remove_partial_output(output_file)
         return 1
-    
+
+    if cache is not None:
+        with instrument.stage('cache_store', bytes_in=os.path.getsize(output_file)):
+            cache.store(key, output_format, output_file)
+
     print(f"Conversion complete! File saved to: {output_file}")
 
     return 0
 
-def select_input_file(input_file_var):
-    file_path = filedialog.askopenfilename(filetypes=[("All Files", "*.*")])
-    if file_path:
-        input_file_var.set(file_path)
+"""BATCH CONVERSION"""
+def find_documents(inputs):
+    # Yields (input_file, relative_folder) so directory trees keep their layout in the output folder
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        yield os.path.join(root, name), os.path.relpath(root, item)
+        else:
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path) and os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS:
+                    yield path, ''
+
+def convert_job(input_file, output_format, output_folder, cache=None, trace=None):
+    # Runs inside a worker process; convert_file's messages go to stderr so stdout only lists failures
+    instrument = Instrumentation(trace.get('path'), keep=True, file=input_file) if trace is not None else NULL_INSTRUMENTATION
+    try:
+        os.makedirs(output_folder, exist_ok=True)
+        with contextlib.redirect_stdout(sys.stderr):
+            code = convert_file(input_file, output_format, output_folder, cache, instrument)
+        return input_file, code, instrument.records
+    finally:
+        if trace is not None:
+            instrument.close()
+
+def batch_main(argv):
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    parser = argparse.ArgumentParser(description="Convert documents without the GUI.")
+    parser.add_argument('inputs', nargs='+', help="Files, folders or glob patterns (use ** for recursion)")
+    parser.add_argument('-o', '--output-folder', required=True)
+    parser.add_argument('-f', '--format', required=True, choices=list(WRITERS))
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--cache-dir', default=None, help="Reuse outputs of unchanged inputs from this folder")
+    parser.add_argument('--trace', default=None, help="Append per-stage timing and memory records to this JSON lines file")
+    parser.add_argument('--trace-summary', action='store_true', help="Print per-stage totals for the whole batch to stderr")
+    parser.add_argument('--dry-run', action='store_true', help="Print the route each file would take and convert nothing")
+    args = parser.parse_args(argv)
+
+    cache = ConversionCache(args.cache_dir) if args.cache_dir else None
+    trace = {'path': args.trace} if args.trace or args.trace_summary else None
+    documents = {}
+    for input_file, relative_folder in find_documents(args.inputs):
+        documents.setdefault(os.path.abspath(input_file), os.path.normpath(os.path.join(args.output_folder, relative_folder)))
+    if not documents:
+        print("No supported documents found.", file=sys.stderr)
+        return 1
+
+    if args.dry_run:
+        for input_file in documents:
+            plan = plan_conversion(input_file, args.format)
+            print(f"{input_file}\t{plan.describe() if plan else 'no route'}")
+        return 0
+
+    failed = []
+    records = []
+    jobs = []
+    outputs = {}
+    for input_file, output_folder in documents.items():
+        # report.txt and report.docx in one folder both map to report_converted<ext>; only the first one is converted
+        output_key = os.path.normcase(os.path.abspath(get_output_path(input_file, output_folder, args.format)))
+        if output_key in outputs:
+            print(f"ERROR: {input_file}: same output file as {outputs[output_key]}", file=sys.stderr)
+            failed.append(input_file)
+            continue
+        outputs[output_key] = input_file
+        jobs.append((input_file, output_folder))
+
+    with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count()) as pool:
+        futures = [pool.submit(convert_job, input_file, args.format, output_folder, cache, trace) for input_file, output_folder in jobs]
+        for future in as_completed(futures):
+            input_file, code, job_records = future.result()
+            records.extend(job_records)
+            if code:
+                failed.append(input_file)
+
+    if args.trace_summary:
+        print_summary(summarize(records))
+    for input_file in failed:
+        print(f"1\t{input_file}")
+    return 1 if failed else 0
+
+def select_input_files(input_files, input_file_var):
+    from tkinter import filedialog
+    file_paths = filedialog.askopenfilenames(filetypes=[("All Files", "*.*")])
+    if file_paths:
+        input_files[:] = file_paths
+        input_file_var.set(file_paths[0] if len(file_paths) == 1 else f"{len(file_paths)} files selected")
 
 def select_output_folder(output_folder_var):
+    from tkinter import filedialog
     folder_path = filedialog.askdirectory()
     if folder_path:
         output_folder_var.set(folder_path)
 
-def start_conversion(input_file_var, output_folder_var, output_format_var, status_label):
-    input_file = input_file_var.get()
+def start_conversion(input_files, output_folder_var, output_format_var, status_label, jobs):
     output_folder = output_folder_var.get()
     output_format = output_format_var.get()
 
-    if not input_file or not output_folder:
+    if not input_files or not output_folder:
         status_label.config(text="ERROR: Select both input file and output folder!", foreground="red")
         return
 
-    input_file_name = os.path.basename(input_file)
-    error = convert_file(input_file, output_format, output_folder)  # Call the conversion function
-    
-    if error:
+    # Each file is converted on the worker pool, so the window keeps responding
+    for input_file in input_files:
+        jobs.submit(os.path.basename(input_file), input_file, output_format, output_folder)
+
+def job_failed(job):
+    # convert_file returns 1 on errors instead of raising
+    from job_queue import DONE
+    return job.error is not None or (job.status == DONE and job.result != 0)
+
+def update_job(job, jobs, job_list, status_label, output_folder_var):
+    from job_queue import DONE
+    text = f"{job.label}: {'failed' if job_failed(job) else job.status}"
+    if job.id < job_list.size():
+        job_list.delete(job.id)
+    job_list.insert(job.id, text)
+    if job_failed(job):
+        job_list.itemconfig(job.id, foreground="red")
+
+    finished, total = jobs.progress()
+    if jobs.active():
+        status_label.config(text=f"Converting... {finished}/{total}", foreground="black")
+        return
+
+    converted = sum(1 for j in jobs.jobs if j.status == DONE and not job_failed(j))
+    if any(job_failed(j) for j in jobs.jobs):
         status_label.config(text="ERROR: Conversion failed!", foreground="red")
-    else:
-        status_label.config(text=f"SUCCESS: Converted {input_file_name} to {output_format}!", foreground="green")
+    elif converted:
+        status_label.config(text=f"SUCCESS: Converted {converted} file(s)!", foreground="green")
         # Open the output folder in the file explorer
-        os.startfile(output_folder)
+        os.startfile(output_folder_var.get())
+    else:
+        status_label.config(text="Conversion cancelled.", foreground="black")
 
 def main():
+    import tkinter as tk
+    from tkinter import StringVar, ttk
+    from job_queue import JobQueue
+
     # Create the main application window
     app = tk.Tk()
     app.title("Text Converter")
 
     # Set window size
-    width, height = 700, 400
+    width, height = 700, 600
 
     # Get screen width and height
     screen_width = app.winfo_screenwidth()
@@ -220,6 +423,7 @@ def main():
     app.configure(bg="#f0f0f0")
 
     # Variables
+    input_files = []
     input_file_var = StringVar()
     output_folder_var = StringVar()
     output_format_var = StringVar(value=".pdf")
@@ -229,10 +433,10 @@ def main():
     main_frame.pack(expand=True)
 
     # File Selection
-    ttk.Label(main_frame, text="Select Input File:").pack(anchor="w", pady=5)
+    ttk.Label(main_frame, text="Select Input Files:").pack(anchor="w", pady=5)
     file_entry = ttk.Entry(main_frame, textvariable=input_file_var, width=40, font=("Arial", 12), state='readonly')
     file_entry.pack(pady=5)
-    ttk.Button(main_frame, text="Browse", command=lambda: select_input_file(input_file_var)).pack(pady=5)
+    ttk.Button(main_frame, text="Browse", command=lambda: select_input_files(input_files, input_file_var)).pack(pady=5)
 
     # Output Folder Selection
     ttk.Label(main_frame, text="Select Output Folder:").pack(anchor="w", pady=5)
@@ -246,15 +450,32 @@ def main():
     format_dropdown.pack(pady=5)
     format_dropdown.current(0)
 
-    # Convert Button
-    convert_button = ttk.Button(main_frame, text="Convert", command=lambda: start_conversion(input_file_var, output_folder_var, output_format_var, status_label))
-    convert_button.pack(pady=20)
+    # Convert and Cancel Buttons
+    button_frame = ttk.Frame(main_frame)
+    button_frame.pack(pady=20)
+    convert_button = ttk.Button(button_frame, text="Convert", command=lambda: start_conversion(input_files, output_folder_var, output_format_var, status_label, jobs))
+    convert_button.pack(side="left", padx=5)
+    ttk.Button(button_frame, text="Cancel", command=lambda: jobs.cancel()).pack(side="left", padx=5)
 
     # Status Label
     status_label = ttk.Label(main_frame, text="", font=("Arial", 12, "bold"))
     status_label.pack(pady=5)
 
+    # Queued conversions and their state
+    job_list = tk.Listbox(main_frame, width=60, height=6)
+    job_list.pack(pady=5)
+
+    jobs = JobQueue(app, convert_file, on_update=lambda job: update_job(job, jobs, job_list, status_label, output_folder_var))
+
+    def close():
+        jobs.shutdown()
+        app.destroy()
+    app.protocol("WM_DELETE_WINDOW", close)
+
     app.mainloop()
 
 if __name__ == "__main__":
+    # Any command line argument switches to the headless batch mode
+    if len(sys.argv) > 1:
+        sys.exit(batch_main(sys.argv[1:]))
     main()
@@ -0,0 +1,71 @@
+import io
+import os
+import mmap
+import codecs
+
+# Plain text reader for files of any size. The file is memory-mapped, its encoding is guessed from
+# the first bytes and it is decoded in chunks that end on a line break, so line-based writers get
+# whole lines and the text is never held in memory all at once.
+CHUNK_SIZE = 1024 * 1024
+SNIFF_SIZE = 64 * 1024
+# Files that are neither UTF-8 nor have a BOM are taken as Windows' Western codepage
+FALLBACK_ENCODING = 'cp1252'
+
+# UTF-32 LE starts like UTF-16 LE, so it is checked first
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+# In these a b'\n' byte is not necessarily a line break, chunks are aligned after decoding instead
+WIDE_ENCODINGS = {'utf-16', 'utf-32'}
+
+def sniff_encoding(prefix):
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    try:
+        # Not final: the prefix may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+def iter_byte_chunks(data, size, align):
+    start = 0
+    while start < size:
+        end = min(start + CHUNK_SIZE, size)
+        if align and end < size:
+            newline = data.rfind(b'\n', start, end)
+            # A line longer than a chunk is simply split
+            if newline >= 0:
+                end = newline + 1
+        yield data[start:end]
+        start = end
+
+def read_txt(file_path):
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            # An empty file cannot be mapped
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            encoding = sniff_encoding(data[:SNIFF_SIZE])
+            wide = encoding in WIDE_ENCODINGS
+            # Undecodable bytes past the sniffed prefix become U+FFFD instead of failing the conversion;
+            # \r\n and \r are turned into \n like text mode would
+            decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)('replace'), True)
+            pending = ''
+            for chunk in iter_byte_chunks(data, size, not wide):
+                text = decoder.decode(chunk)
+                if wide:
+                    text = pending + text
+                    cut = text.rfind('\n') + 1 or len(text)
+                    text, pending = text[:cut], text[cut:]
+                if text:
+                    yield text
+            text = pending + decoder.decode(b'', True)
+            if text:
+                yield text
@@ -0,0 +1,61 @@
+import zipfile
+import xml.etree.ElementTree as ET
+
+# DOCX and ODT readers that stream the document XML out of the zip with iterparse instead of
+# building the whole DOM (python-docx, odfpy). Each paragraph is yielded as soon as it has been
+# parsed, then cleared and detached so memory stays flat however long the document is.
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+TEXT = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+
+def iter_paragraph_elements(stream, paragraph_tags, block_depth):
+    # block_depth: how deep the document's blocks (paragraphs, tables...) sit, e.g. w:document/w:body/w:p is 3.
+    # Once a block has ended it is removed from its parent, otherwise the emptied elements would pile up.
+    stack = []
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag in paragraph_tags:
+            yield elem
+            elem.clear()
+        if len(stack) == block_depth - 1:
+            stack[-1].remove(elem)
+
+def docx_paragraph_text(paragraph):
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == W + 't':
+            parts.append(node.text or '')
+        elif node.tag == W + 'tab':
+            parts.append('\t')
+        elif node.tag in (W + 'br', W + 'cr'):
+            parts.append('\n')
+    return ''.join(parts)
+
+def read_docx(file_path):
+    with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as stream:
+        for i, paragraph in enumerate(iter_paragraph_elements(stream, {W + 'p'}, 3)):
+            yield ('\n' if i else '') + docx_paragraph_text(paragraph)
+
+def odt_element_text(elem, parts):
+    if elem.text:
+        parts.append(elem.text)
+    for child in elem:
+        if child.tag == TEXT + 's':
+            parts.append(' ' * int(child.get(TEXT + 'c', '1')))
+        elif child.tag == TEXT + 'tab':
+            parts.append('\t')
+        elif child.tag == TEXT + 'line-break':
+            parts.append('\n')
+        else:
+            odt_element_text(child, parts)
+        if child.tail:
+            parts.append(child.tail)
+    return parts
+
+def read_odt(file_path):
+    with zipfile.ZipFile(file_path) as archive, archive.open('content.xml') as stream:
+        # office:document-content/office:body/office:text/text:p
+        for paragraph in iter_paragraph_elements(stream, {TEXT + 'p', TEXT + 'h'}, 4):
+            yield ''.join(odt_element_text(paragraph, [])) + '\n'
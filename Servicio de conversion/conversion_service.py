@@ -0,0 +1,608 @@
+import io
+import os
+import sys
+import json
+import time
+import signal
+import hashlib
+import argparse
+import itertools
+import mimetypes
+import tempfile
+import threading
+import contextlib
+import multiprocessing
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Resident conversion service. The worker processes import both converters once and keep them loaded
+# (Pillow, cairosvg, the route planner, pandoc's pool), so a conversion no longer pays for interpreter
+# startup and backend bootstrap. Files in the watched folders are converted when they are new or their
+# mtime or size changed, and a small HTTP API on localhost takes jobs from other programs, like the QR app:
+#
+#   POST /jobs                       {"input": "C:/marcadores/logo.svg", "format": ".png"}  -> job
+#   POST /jobs?name=logo.svg&format=.png   (the body is the file itself)                 -> job
+#   GET  /jobs                       every job the service remembers
+#   GET  /jobs/<id>                  status of one job
+#   GET  /jobs/<id>/result           the converted file, once the job is done
+#   GET  /health                     workers, pending jobs and the formats that can be asked for
+#
+# Inputs given by path must be inside a watched folder; outputs always go under the output folder.
+# Browsers can only call the API from the origins given with --allow-origin, and while the service
+# listens on this computer only, requests must name it as localhost (no DNS rebinding).
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXT_FOLDER = os.path.join(ROOT, 'Procesadores de texto')
+IMAGE_FOLDER = os.path.join(ROOT, 'Procesadores de imagen')
+sys.path[:0] = [TEXT_FOLDER, IMAGE_FOLDER]
+
+import image_converter_david as image
+import text_converter_david as text
+from encoder_profiles import DEFAULT_PROFILE, PROFILES
+from job_queue import QUEUED, RUNNING, DONE, FAILED, CANCELLED
+
+DEFAULT_PORT = 8765
+# Jobs queued or running before new ones are refused with 503; the watcher simply tries again later
+MAX_PENDING = 256
+# Finished jobs kept for status and result requests
+KEEP_FINISHED = 1000
+MAX_UPLOAD = 512 * 1024 * 1024
+MAX_REQUEST = 64 * 1024
+COPY_CHUNK = 1024 * 1024
+UPLOAD_FOLDER = 'uploads'
+STATE_FILE = '.conversion_service.json'
+LOOPBACK_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
+class Busy(Exception):
+    pass
+
+class Forbidden(Exception):
+    pass
+
+"""WORKERS"""
+def warm_worker():
+    # Runs once in every worker process, before its first job: the converters are already imported
+    # with this module, what is left is probing pandoc and loading cairo
+    text.get_planner()
+    with contextlib.suppress(ImportError, OSError):
+        from svg_engine import load_cairosvg
+        load_cairosvg()
+
+def known_format(output_format):
+    return output_format in image.SUPPORTED_EXTENSIONS or output_format in text.WRITERS
+
+def kind_of(input_file, output_format):
+    ext = os.path.splitext(input_file)[1].lower()
+    if ext in image.SUPPORTED_EXTENSIONS and output_format in image.SUPPORTED_EXTENSIONS:
+        return 'image'
+    if ext in text.SUPPORTED_EXTENSIONS and output_format in text.WRITERS:
+        return 'text'
+    return None
+
+def is_inside(path, folder):
+    try:
+        return os.path.commonpath([path, folder]) == folder
+    except ValueError:
+        # Different drives
+        return False
+
+def run_conversion(kind, input_file, output_format, output_folder, profile):
+    # Runs in a worker process; returns (error or None, output files)
+    os.makedirs(output_folder, exist_ok=True)
+    if kind == 'image':
+        output_file = image.get_output_path(input_file, output_folder, output_format)
+        _, code, error, _ = image.convert_job(input_file, output_file, output_format, profile=profile)
+        return (error or "Conversion failed") if code else None, [output_file]
+    # convert_file reports on stdout, its last line says what went wrong
+    messages = io.StringIO()
+    with contextlib.redirect_stdout(messages):
+        code = text.convert_file(input_file, output_format, output_folder)
+    output_file = text.get_output_path(input_file, output_folder, output_format)
+    lines = messages.getvalue().strip().splitlines()
+    return (lines[-1] if lines else "Conversion failed") if code else None, [output_file]
+
+"""JOBS"""
+class Job:
+    def __init__(self, job_id, kind, input_file, output_format, output_folder, profile, key):
+        self.id = job_id
+        self.kind = kind
+        self.input_file = input_file
+        self.output_format = output_format
+        self.output_folder = output_folder
+        self.profile = profile
+        self.key = key
+        self.status = QUEUED
+        self.error = None
+        self.outputs = []
+        self.created = time.time()
+        self.finished_at = None
+
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def reusable(self, key):
+        # A queued, running or done conversion of the same version; done only while its files are still there
+        return self.key == key and self.status != FAILED and self.status != CANCELLED and all(map(os.path.exists, self.outputs))
+
+    def describe(self):
+        info = {
+            'id': self.id, 'status': self.status, 'kind': self.kind, 'input': self.input_file,
+            'format': self.output_format, 'profile': self.profile, 'error': self.error,
+            'outputs': self.outputs, 'created': self.created, 'finished': self.finished_at,
+        }
+        if self.status == DONE:
+            info['result'] = f"/jobs/{self.id}/result"
+        return info
+
+class ConversionService:
+    def __init__(self, output_folder, watched_folders=(), workers=None, max_pending=MAX_PENDING):
+        self.output_folder = os.path.abspath(output_folder)
+        self.upload_folder = os.path.join(self.output_folder, UPLOAD_FOLDER)
+        # The only folders inputs are taken from, besides the uploads
+        self.watched_folders = list(dict.fromkeys(os.path.realpath(folder) for folder in watched_folders))
+        # Each one is mirrored in output/<folder name>, so two folders with the same name (or one called
+        # like the uploads) would write over each other's results
+        names = {os.path.normcase(UPLOAD_FOLDER): self.upload_folder}
+        for folder in self.watched_folders:
+            name = os.path.basename(folder)
+            if not name:
+                raise ValueError(f"Cannot watch {folder}, its outputs need a folder name")
+            if os.path.normcase(name) in names:
+                raise ValueError(f"{folder} and {names[os.path.normcase(name)]} would share the output folder "
+                                 f"{os.path.join(self.output_folder, name)}, watch folders with different names")
+            names[os.path.normcase(name)] = folder
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        # Spawned rather than forked: the HTTP server and the watcher are threads
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=warm_worker)
+        # One thread per worker process waits for a conversion, so at most `workers` run at once
+        self.runners = ThreadPoolExecutor(self.workers)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.jobs = {}
+        # A target is one input file converted to one format in one folder. Only one job per target
+        # runs at a time; if the file changes meanwhile, its newest version waits for the running one.
+        self.running = {}
+        self.waiting = {}
+        # Finished jobs by key (target plus the input's mtime and size)
+        self.results = {}
+
+    def start(self):
+        # Bring every worker up now instead of on the first jobs
+        for _ in range(self.workers):
+            self.pool.submit(os.getpid)
+
+    def close(self):
+        self.runners.shutdown(wait=False, cancel_futures=True)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def output_folder_for(self, input_file):
+        # Uploads are converted next to the stored file, watched files mirror their folder in
+        # output/<watched folder name>/<subfolders>; any other file is not an input (None)
+        if is_inside(input_file, os.path.realpath(self.upload_folder)):
+            return os.path.dirname(input_file)
+        for folder in self.watched_folders:
+            if is_inside(input_file, folder):
+                relative = os.path.relpath(os.path.dirname(input_file), folder)
+                return os.path.normpath(os.path.join(self.output_folder, os.path.basename(folder), relative))
+        return None
+
+    def submit(self, input_file, output_format, profile=None):
+        # Returns (job, created); created is False when an equal job was already queued, running or done.
+        # Raises Forbidden for a file outside the watched and upload folders, OSError for a missing input,
+        # ValueError for a bad request and Busy when the queue is full.
+        # Links are resolved first, so one inside a watched folder cannot point outside it
+        input_file = os.path.realpath(input_file)
+        output_folder = self.output_folder_for(input_file)
+        if output_folder is None:
+            raise Forbidden(f"{input_file} is not inside a watched folder")
+        output_format = '.' + output_format.lstrip('.').lower()
+        kind = kind_of(input_file, output_format)
+        if kind is None:
+            raise ValueError(f"Cannot convert {os.path.basename(input_file)} to {output_format}")
+        if kind == 'image':
+            profile = profile or DEFAULT_PROFILE
+            if profile not in PROFILES:
+                raise ValueError(f"Unknown profile '{profile}', use one of: {', '.join(PROFILES)}")
+        else:
+            profile = None
+        stat = os.stat(input_file)
+        target = (input_file, output_format, output_folder, profile)
+        key = target + (stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            for job in (self.running.get(target), self.waiting.get(target), self.results.get(key)):
+                if job is not None and job.reusable(key):
+                    return job, False
+            if len(self.running) + len(self.waiting) >= self.max_pending:
+                raise Busy(f"{self.max_pending} jobs are already pending")
+            job = Job(str(next(self.ids)), kind, input_file, output_format, output_folder, profile, key)
+            self.jobs[job.id] = job
+            if target in self.running:
+                superseded = self.waiting.get(target)
+                if superseded is not None:
+                    superseded.status = CANCELLED
+                    superseded.error = f"Superseded by job {job.id}"
+                    superseded.finished_at = time.time()
+                self.waiting[target] = job
+            else:
+                self._start(target, job)
+            self._forget_old()
+        return job, True
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def describe(self):
+        with self.lock:
+            pending = len(self.running) + len(self.waiting)
+        return {
+            'workers': self.workers, 'pending': pending, 'profiles': PROFILES,
+            'formats': {
+                'image': {'inputs': image.SUPPORTED_EXTENSIONS, 'outputs': image.SUPPORTED_EXTENSIONS},
+                'text': {'inputs': text.SUPPORTED_EXTENSIONS, 'outputs': list(text.WRITERS)},
+            },
+        }
+
+    def save_upload(self, name, stream, length):
+        # Uploads are stored under the hash of their content, so sending the same file again gives the
+        # same input (same mtime too, it is not rewritten) and therefore the same job
+        name = os.path.basename(name.replace('\\', '/'))
+        if not name or name.startswith('.'):
+            raise ValueError("The upload needs a file name")
+        uploads = self.upload_folder
+        os.makedirs(uploads, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=uploads)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                remaining = length
+                while remaining:
+                    chunk = stream.read(min(COPY_CHUNK, remaining))
+                    if not chunk:
+                        raise ValueError("The upload ended early")
+                    digest.update(chunk)
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            folder = os.path.join(uploads, digest.hexdigest()[:16])
+            path = os.path.join(folder, name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(folder, exist_ok=True)
+                os.replace(temp_path, path)
+            return path
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+
+    def _start(self, target, job):
+        self.running[target] = job
+        self.runners.submit(self._run, target, job)
+
+    def _run(self, target, job):
+        job.status = RUNNING
+        try:
+            error, outputs = self.pool.submit(run_conversion, job.kind, job.input_file, job.output_format,
+                                              job.output_folder, job.profile).result()
+        except Exception as e:
+            # A worker that died (out of memory, a crash in a native library) fails its job, not the service
+            error, outputs = str(e) or type(e).__name__, []
+        with self.lock:
+            job.error = error
+            job.outputs = [] if error else outputs
+            job.status = FAILED if error else DONE
+            job.finished_at = time.time()
+            self.results[job.key] = job
+            del self.running[target]
+            following = self.waiting.pop(target, None)
+            if following is not None:
+                self._start(target, following)
+        if error:
+            print(f"FAILED\t{job.input_file}\t{error}", file=sys.stderr)
+        else:
+            print(f"done\t{job.input_file}\t{', '.join(outputs)}", file=sys.stderr)
+
+    def _forget_old(self):
+        finished = [job for job in self.jobs.values() if job.finished()]
+        for job in finished[:max(len(finished) - KEEP_FINISHED, 0)]:
+            del self.jobs[job.id]
+            if self.results.get(job.key) is job:
+                del self.results[job.key]
+
+"""WATCHER"""
+def iter_files(folder, skip):
+    for dirpath, dirnames, filenames in os.walk(folder):
+        # The output folder may be inside a watched one, its files are never inputs
+        dirnames[:] = [name for name in dirnames if os.path.join(dirpath, name) != skip]
+        for name in filenames:
+            yield os.path.join(dirpath, name)
+
+class FolderWatcher:
+    # Polls the watched folders, which works the same on every system and on network drives.
+    # A file is converted once its mtime and size hold still for one interval (so half-copied files
+    # wait) and differ from the last version converted. Converted versions are kept in a state file,
+    # so a restart only converts what changed while the service was down.
+    def __init__(self, service, watches, interval=2.0, state_path=None):
+        self.service = service
+        self.watches = [(os.path.abspath(folder), output_format) for folder, output_format in watches]
+        self.interval = interval
+        self.state_path = state_path
+        self.state = self.load_state()
+        self.seen = {}
+        self.submitted = {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='folder-watcher', daemon=True)
+
+    def load_state(self):
+        # {format: {input file: [mtime_ns, size]}}
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (TypeError, OSError, ValueError):
+            return {}
+
+    def save_state(self):
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(temp_path, self.state_path)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"Watch error: {e}", file=sys.stderr)
+            self.stop_event.wait(self.interval)
+
+    def scan(self):
+        changed = False
+        # A finished job's version counts as converted; failed ones too, they are retried once the file changes
+        for item, (signature, job) in list(self.submitted.items()):
+            if job.finished():
+                del self.submitted[item]
+                if job.status != CANCELLED:
+                    path, output_format = item
+                    self.state.setdefault(output_format, {})[path] = signature
+                    changed = True
+
+        seen = {}
+        for folder, output_format in self.watches:
+            converted = self.state.setdefault(output_format, {})
+            for path in iter_files(folder, self.service.output_folder):
+                if kind_of(path, output_format) is None:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # Deleted between the listing and now
+                    continue
+                item = (path, output_format)
+                signature = seen[item] = [stat.st_mtime_ns, stat.st_size]
+                if signature != self.seen.get(item) or signature == converted.get(path):
+                    continue
+                if item in self.submitted and self.submitted[item][0] == signature:
+                    continue
+                try:
+                    job, _ = self.service.submit(path, output_format)
+                except Busy:
+                    continue
+                except (Forbidden, OSError, ValueError) as e:
+                    # Like a failed job: reported once, tried again when the file changes
+                    print(f"FAILED\t{path}\t{e}", file=sys.stderr)
+                    converted[path] = signature
+                    changed = True
+                    continue
+                self.submitted[item] = (signature, job)
+        self.seen = seen
+
+        # Deleted files are forgotten, a file added back under the same name is converted again
+        for output_format, converted in self.state.items():
+            for path in [path for path in converted if (path, output_format) not in seen]:
+                del converted[path]
+                changed = True
+        if changed and self.state_path:
+            self.save_state()
+
+"""HTTP API"""
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = 'ConversionService/1.0'
+
+    def end_headers(self):
+        # Only the origins allowed with --allow-origin (the QR app's `expo start --web`, say) may read
+        # the answers from a browser
+        origin = self.headers.get('Origin') if getattr(self, 'headers', None) else None
+        if origin in self.server.allowed_origins:
+            self.send_header('Access-Control-Allow-Origin', origin)
+            self.send_header('Vary', 'Origin')
+        super().end_headers()
+
+    def check_request(self):
+        # Refuses (with 403) what a web page could send behind the user's back: requests from other
+        # origins, even the ones browsers send without asking first, and requests to a host name that
+        # only resolves here (DNS rebinding). Programs that are not browsers send no Origin.
+        origin = self.headers.get('Origin')
+        if origin is not None and origin not in self.server.allowed_origins:
+            self.send_error_json(403, f"Origin {origin} is not allowed, start the service with --allow-origin {origin}")
+            return False
+        host = (self.headers.get('Host') or '').rsplit(':', 1)[0].strip('[]').lower()
+        if self.server.allowed_hosts is not None and host not in self.server.allowed_hosts:
+            self.send_error_json(403, f"Host {host} is not allowed")
+            return False
+        return True
+
+    def send_json(self, status, body, headers=()):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message, headers=()):
+        self.send_json(status, {'error': message}, headers)
+
+    def do_OPTIONS(self):
+        if not self.check_request():
+            return
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+
+    def do_GET(self):
+        if not self.check_request():
+            return
+        service = self.server.service
+        url = urllib.parse.urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ['health']:
+            return self.send_json(200, service.describe())
+        if parts == ['jobs']:
+            return self.send_json(200, {'jobs': [job.describe() for job in service.list_jobs()]})
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = service.get(parts[1])
+            if job is None:
+                return self.send_error_json(404, f"No job {parts[1]}")
+            if len(parts) == 2:
+                return self.send_json(200, job.describe())
+            if parts[2] == 'result':
+                return self.send_result(job, dict(urllib.parse.parse_qsl(url.query)))
+        self.send_error_json(404, "Not found")
+
+    def send_result(self, job, query):
+        if job.status != DONE:
+            # Not ready yet (or failed): the body says which, the client polls /jobs/<id>
+            return self.send_json(409, job.describe())
+        try:
+            path = job.outputs[int(query.get('file', 0))]
+            f = open(path, 'rb')
+        except (ValueError, IndexError):
+            return self.send_error_json(404, "No such output")
+        except OSError:
+            return self.send_error_json(410, "The output was removed, submit the job again")
+        with f:
+            self.send_response(200)
+            self.send_header('Content-Type', mimetypes.guess_type(path)[0] or 'application/octet-stream')
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(path)}"')
+            self.end_headers()
+            while chunk := f.read(COPY_CHUNK):
+                self.wfile.write(chunk)
+
+    def content_length(self):
+        # None when the header is missing; anything but a plain non-negative number is a bad request
+        value = self.headers.get('Content-Length')
+        if value is None:
+            return None
+        value = value.strip()
+        if not (value.isascii() and value.isdigit()):
+            raise ValueError(f"Bad Content-Length: {value}")
+        return int(value)
+
+    def do_POST(self):
+        if not self.check_request():
+            return
+        service = self.server.service
+        url = urllib.parse.urlsplit(self.path)
+        if [part for part in url.path.split('/') if part] != ['jobs']:
+            return self.send_error_json(404, "Not found")
+        try:
+            length = self.content_length()
+            if self.headers.get_content_type() == 'application/json':
+                if length is not None and length > MAX_REQUEST:
+                    return self.send_error_json(413, "Request too large")
+                request = json.loads(self.rfile.read(length or 0) or b'{}')
+                job, created = service.submit(request['input'], request['format'], request.get('profile'))
+            else:
+                # Raw upload: the body is the file, name and format come in the query string;
+                # the output is written next to the stored upload
+                if length is None:
+                    return self.send_error_json(411, "Uploads need a Content-Length")
+                if length > MAX_UPLOAD:
+                    return self.send_error_json(413, "Upload too large")
+                query = dict(urllib.parse.parse_qsl(url.query))
+                output_format = query['format']
+                input_file = service.save_upload(query['name'], self.rfile, length)
+                job, created = service.submit(input_file, output_format, query.get('profile'))
+        except Forbidden as e:
+            return self.send_error_json(403, str(e))
+        except KeyError as e:
+            return self.send_error_json(400, f"Missing {e.args[0]}")
+        except (ValueError, AttributeError, TypeError) as e:
+            return self.send_error_json(400, str(e) or "Bad request")
+        except OSError as e:
+            return self.send_error_json(404, f"Cannot read input: {e}")
+        except Busy as e:
+            return self.send_error_json(503, str(e), [('Retry-After', '5')])
+        self.send_json(202 if created else 200, job.describe(), [('Location', f"/jobs/{job.id}")])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep the converters loaded, convert new and changed files in watched folders "
+                                                 "and take conversion jobs over HTTP.")
+    parser.add_argument('-o', '--output-folder', required=True, help="Where converted files (and uploads) go")
+    parser.add_argument('--watch', nargs=2, action='append', default=[], metavar=('FOLDER', 'FORMAT'),
+                        help="Convert new and changed files in FOLDER to FORMAT, e.g. --watch marcadores .png (repeatable)")
+    parser.add_argument('--interval', type=float, default=2.0, help="Seconds between scans of the watched folders (default: 2)")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: 127.0.0.1, this computer only)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"HTTP port (default: {DEFAULT_PORT})")
+    parser.add_argument('--allow-origin', action='append', default=[], metavar='ORIGIN',
+                        help="Web origin allowed to call the API from a browser, e.g. http://localhost:8081 for "
+                             "`expo start --web` (repeatable); requests from any other origin are refused")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Conversions at once, one process each (default: CPU count)")
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING, help=f"Queued and running jobs before new ones are refused (default: {MAX_PENDING})")
+    args = parser.parse_args(argv)
+
+    for folder, output_format in args.watch:
+        if not os.path.isdir(folder):
+            parser.error(f"{folder} is not a folder")
+        if not known_format(output_format):
+            parser.error(f"Unknown output format {output_format}")
+
+    try:
+        service = ConversionService(args.output_folder, [folder for folder, _ in args.watch], args.workers, args.max_pending)
+    except ValueError as e:
+        parser.error(str(e))
+    os.makedirs(service.output_folder, exist_ok=True)
+    service.start()
+    watcher = None
+    if args.watch:
+        watcher = FolderWatcher(service, args.watch, args.interval, os.path.join(service.output_folder, STATE_FILE))
+        watcher.start()
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    server.service = service
+    server.allowed_origins = set(args.allow_origin)
+    # Listening on the network was asked for explicitly, then any host name is fine
+    server.allowed_hosts = LOOPBACK_HOSTS if args.host in LOOPBACK_HOSTS else None
+    print(f"Listening on http://{args.host}:{server.server_port}", file=sys.stderr)
+    # Stopped as a service (kill, systemd, docker stop) it cleans up the same way as with Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if watcher is not None:
+            watcher.stop()
+        service.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())